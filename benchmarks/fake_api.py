@@ -0,0 +1,250 @@
+"""Local stand-in for the SNCF (Navitia) API used by the benchmarks.
+
+Responses are built from the recorded payloads of the fixtures directory,
+with identifiers and times filled in for the requested stations. Every
+station has the same two lines, trains leave every TRAIN_INTERVAL and
+journeys with connections change trains at HUB. The disruption feed of a
+line lists the recorded disruptions and the ones of the delayed trains of
+that line announced so far.
+
+Latency and errors can be injected, and requests are counted by endpoint.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import Counter, defaultdict
+import copy
+from datetime import datetime, timedelta
+import json
+from pathlib import Path
+import random
+from zoneinfo import ZoneInfo
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+FIXTURES = Path(__file__).parent / "fixtures"
+API_FORMAT = "%Y%m%dT%H%M%S"
+TIMEZONE = ZoneInfo("Europe/Paris")
+TRAIN_INTERVAL = timedelta(minutes=20)
+TRAIN_DURATION = timedelta(minutes=45)
+HUB = "HUB"
+
+
+def load_fixture(name: str) -> dict:
+    with open(FIXTURES / f"{name}.json", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def station_id(object_id: str) -> str:
+    """Return the station code of a stop area or stop point id."""
+    return object_id.split(":")[-1]
+
+
+class FakeSncfApi(object):
+    """aiohttp application answering the requests sent by the integration.
+
+    latency is the mean delay of a response in seconds, with up to jitter
+    seconds added or removed. error_rate is the share of requests answered
+    with a 503 error and disruption_rate the share of journeys announced as
+    delayed, which changes from one request to the next.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, disruption_rate: float = 0.1, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.disruption_rate = disruption_rate
+        self.random = random.Random(seed)
+        self.calls: Counter[str] = Counter()
+        # Disruptions of the delayed trains announced by the journeys of each line
+        self.line_disruption_ids: defaultdict[str, set[str]] = defaultdict(set)
+        self.fixtures = {name: load_fixture(name) for name in (
+            "coverage", "places", "stop_area", "lines", "stop_points", "journey", "disruption", "line_disruptions"
+        )}
+        self._server: TestServer | None = None
+
+    @property
+    def requests(self) -> int:
+        return sum(self.calls.values())
+
+    async def async_start(self) -> str:
+        """Start the server and return the root URL to configure."""
+        app = web.Application()
+        app.router.add_route("GET", "/{tail:.*}", self.handle)
+        self._server = TestServer(app)
+        await self._server.start_server()
+        return str(self._server.make_url("/v1"))
+
+    async def async_stop(self) -> None:
+        if self._server is not None:
+            await self._server.close()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        endpoint = self.endpoint(request.path)
+        self.calls[endpoint] += 1
+
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(self.latency + self.random.uniform(-self.jitter, self.jitter), 0))
+        if self.error_rate and self.random.random() < self.error_rate:
+            return web.json_response({"error": {"id": "internal_error", "message": "injected error"}}, status=503)
+
+        return getattr(self, f"response_{endpoint}")(request)
+
+    @staticmethod
+    def endpoint(path: str) -> str:
+        parts = path.rstrip("/").split("/")
+        if parts[-1] == "coverage":
+            return "coverage"
+        if parts[-1] in ("places", "journeys", "lines", "stop_points"):
+            return parts[-1]
+        if parts[-1] == "disruptions" and "lines" in parts:
+            return "line_disruptions"
+        if parts[-2] == "disruptions":
+            return "disruption"
+        if parts[-2] == "stop_areas":
+            return "stop_area"
+        return "unknown"
+
+    def response_unknown(self, request: web.Request) -> web.Response:
+        return web.json_response({"error": {"id": "unknown_object"}}, status=404)
+
+    def response_coverage(self, request: web.Request) -> web.Response:
+        return web.json_response(self.fixtures["coverage"])
+
+    @staticmethod
+    def _fill_area(area: dict, code: str) -> dict:
+        area["id"] = f"stop_area:BENCH:{code}"
+        area["name"] = code
+        area["label"] = f"{code} (Bench)"
+        return area
+
+    @staticmethod
+    def _fill_stop_point(stop_point: dict, code: str) -> dict:
+        stop_point["id"] = f"stop_point:BENCH:{code}"
+        stop_point["name"] = code
+        stop_point["label"] = f"{code} (Bench)"
+        FakeSncfApi._fill_area(stop_point["stop_area"], code)
+        return stop_point
+
+    def response_places(self, request: web.Request) -> web.Response:
+        code = request.query.get("q", "").strip().upper()
+        payload = copy.deepcopy(self.fixtures["places"])
+        place = payload["places"][0]
+        self._fill_area(place["stop_area"], code)
+        place["id"] = place["stop_area"]["id"]
+        place["name"] = place["stop_area"]["label"]
+        return web.json_response(payload)
+
+    def response_stop_area(self, request: web.Request) -> web.Response:
+        payload = copy.deepcopy(self.fixtures["stop_area"])
+        self._fill_area(payload["stop_areas"][0], station_id(request.path.rstrip("/")))
+        return web.json_response(payload)
+
+    def response_lines(self, request: web.Request) -> web.Response:
+        return web.json_response(self.fixtures["lines"])
+
+    def response_stop_points(self, request: web.Request) -> web.Response:
+        code = station_id(request.path.split("/stop_areas/")[1].split("/")[0])
+        payload = copy.deepcopy(self.fixtures["stop_points"])
+        self._fill_stop_point(payload["stop_points"][0], code)
+        return web.json_response(payload)
+
+    def response_line_disruptions(self, request: web.Request) -> web.Response:
+        parts = request.path.rstrip("/").split("/")
+        line_id = parts[parts.index("lines") + 1]
+        payload = copy.deepcopy(self.fixtures["line_disruptions"])
+        payload["disruptions"].extend(self._disruption(disruption_id) for disruption_id in sorted(self.line_disruption_ids[line_id]))
+        payload["pagination"]["items_on_page"] = payload["pagination"]["total_result"] = len(payload["disruptions"])
+        return web.json_response(payload)
+
+    def response_disruption(self, request: web.Request) -> web.Response:
+        return web.json_response({"disruptions": [self._disruption(request.path.rstrip("/").split("/")[-1])]})
+
+    def _disruption(self, disruption_id: str) -> dict:
+        # Disruption ids are made of the station and the departure of the delayed train
+        code, departure = disruption_id.split("_")[1:3]
+        disruption = copy.deepcopy(self.fixtures["disruption"]["disruptions"][0])
+        disruption["id"] = disruption_id
+        for impacted_object in disruption["impacted_objects"]:
+            for impacted_stop in impacted_object["impacted_stops"]:
+                self._fill_stop_point(impacted_stop["stop_point"], code)
+                base = datetime.strptime(departure, "%H%M%S")
+                impacted_stop["base_departure_time"] = impacted_stop["base_arrival_time"] = base.strftime("%H%M%S")
+                impacted_stop["amended_departure_time"] = impacted_stop["amended_arrival_time"] = (base + timedelta(minutes=10)).strftime("%H%M%S")
+        return disruption
+
+    def _section(self, departure: datetime, start: str, end: str, trip: str, disrupted: bool, line_id: str | None) -> dict:
+        section = copy.deepcopy(self.fixtures["journey"]["sections"][0])
+        arrival = departure + TRAIN_DURATION
+        section["id"] = f"section_{start}_{end}_{departure:%H%M%S}"
+        section["duration"] = int(TRAIN_DURATION.total_seconds())
+        for key, value in (("departure_date_time", departure), ("arrival_date_time", arrival)):
+            section[key] = section[f"base_{key}"] = value.strftime(API_FORMAT)
+        self._fill_stop_point(section["from"]["stop_point"], start)
+        self._fill_stop_point(section["to"]["stop_point"], end)
+        section["display_informations"]["trip_short_name"] = trip
+        section["display_informations"]["links"] = []
+        if disrupted:
+            disruption_id = f"disruption_{start}_{departure:%H%M%S}"
+            section["display_informations"]["links"].append({"type": "disruption", "id": disruption_id})
+            if line_id is not None:
+                self.line_disruption_ids[line_id].add(disruption_id)
+        section["stop_date_times"][0]["departure_date_time"] = section["stop_date_times"][0]["arrival_date_time"] = departure.strftime(API_FORMAT)
+        section["stop_date_times"][-1]["departure_date_time"] = section["stop_date_times"][-1]["arrival_date_time"] = arrival.strftime(API_FORMAT)
+        self._fill_stop_point(section["stop_date_times"][0]["stop_point"], start)
+        self._fill_stop_point(section["stop_date_times"][-1]["stop_point"], end)
+        return section
+
+    def _journey(self, departure: datetime, start: str, end: str, transfers: bool, line_id: str | None) -> dict:
+        journey = copy.deepcopy(self.fixtures["journey"])
+        disrupted = self.random.random() < self.disruption_rate
+        if transfers:
+            second = departure + TRAIN_DURATION + timedelta(minutes=10)
+            sections = [
+                self._section(departure, start, HUB, f"{departure:%H%M}1", disrupted, line_id),
+                {"type": "transfer", "id": "transfer", "duration": 600},
+                self._section(second, HUB, end, f"{departure:%H%M}2", False, line_id)
+            ]
+            arrival = second + TRAIN_DURATION
+        else:
+            sections = [self._section(departure, start, end, f"{departure:%H%M}0", disrupted, line_id)]
+            arrival = departure + TRAIN_DURATION
+
+        journey["sections"] = sections
+        journey["duration"] = int((arrival - departure).total_seconds())
+        journey["nb_transfers"] = 1 if transfers else 0
+        journey["departure_date_time"] = departure.strftime(API_FORMAT)
+        journey["arrival_date_time"] = arrival.strftime(API_FORMAT)
+        journey["requested_date_time"] = departure.strftime(API_FORMAT)
+        return journey
+
+    @staticmethod
+    def departures(after: datetime) -> list[datetime]:
+        """Departures of the day of after and of the next day, from 5:00 to 23:40."""
+        departures = []
+        for day in (after.date(), after.date() + timedelta(days=1)):
+            departure = datetime.combine(day, datetime.min.time()) + timedelta(hours=5)
+            while departure.date() == day:
+                departures.append(departure)
+                departure += TRAIN_INTERVAL
+        return departures
+
+    def response_journeys(self, request: web.Request) -> web.Response:
+        query = request.query
+        start = station_id(query["from"])
+        end = station_id(query["to"])
+        count = int(query.get("count", 1))
+        if "datetime" in query:
+            after = datetime.strptime(query["datetime"], API_FORMAT)
+        else:
+            after = datetime.now(TIMEZONE).replace(tzinfo=None)
+
+        departures = [departure for departure in self.departures(after) if departure >= after][:count]
+        if not departures:
+            return web.json_response({"error": {"id": "no_solution"}}, status=404)
+
+        transfers = query.get("max_nb_transfers", "0") != "0"
+        # Journeys restricted to a line are the ones of its trains
+        line_id = query.get("allowed_id[]")
+        return web.json_response({"journeys": [self._journey(departure, start, end, transfers, line_id) for departure in departures]})
@@ -0,0 +1,374 @@
+"""Measure the cost of the integration for an increasing number of routes.
+
+Routes are added through the config flow and refreshed against the local
+fake SNCF API of fake_api.py, inside a test Home Assistant instance. It
+needs the development dependencies (pytest-homeassistant-custom-component)
+and runs from the root of the repository:
+
+    python -m benchmarks.run --routes 1 10 100 500 --output bench_output.txt
+
+For each number of routes it reports:
+
+- the time and API calls of the config flow of a route, and of its setup
+- the refresh latency of a route (median and 95th percentile) and of a
+  refresh of every route at once
+- the API calls of a refresh of a route, and per hour at the refresh rate
+  the coordinators settled on (next journeys, plus the last journey)
+- the state writes of a refresh and of the minute tick, per route
+- the longest event loop stall and the total time it was blocked
+- the memory allocated per route by the setup
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from dataclasses import dataclass, fields
+import gc
+import logging
+import statistics
+import sys
+import tempfile
+from time import perf_counter
+import tracemalloc
+
+from homeassistant import config_entries, loader
+from homeassistant.helpers.entity import Entity
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import async_test_home_assistant
+
+from custom_components.train_traveler.const import DOMAIN, CONF_NEXT_JOURNEY
+from custom_components.train_traveler.routes import routes_data, route_coordinators
+
+from .fake_api import FakeSncfApi
+
+# Share of the stations: each start station is used by this number of routes
+ROUTES_PER_START = 20
+
+
+def station_code(prefix: str, index: int) -> str:
+    return prefix + chr(ord("A") + index // 26 % 26) + chr(ord("A") + index % 26)
+
+
+class LoopMonitor(object):
+    """Measure how long the event loop is blocked by sleeping in a loop and timing the wake ups."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.max_lag = 0.0
+        self.blocked = 0.0
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - started - self.interval, 0)
+            self.max_lag = max(self.max_lag, lag)
+            self.blocked += lag
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+class WriteCounter(object):
+    """Count the state writes of every entity."""
+
+    def __init__(self):
+        self.writes = 0
+        self._original = Entity.async_write_ha_state
+
+    def __enter__(self) -> WriteCounter:
+        counter = self
+        original = self._original
+
+        def async_write_ha_state(entity) -> None:
+            counter.writes += 1
+            original(entity)
+
+        Entity.async_write_ha_state = async_write_ha_state
+        return self
+
+    def __exit__(self, *args) -> None:
+        Entity.async_write_ha_state = self._original
+
+
+@dataclass
+class Result:
+    routes: int
+    flow_ms: float
+    flow_calls: float
+    setup_ms: float
+    setup_calls: float
+    refresh_p50_ms: float
+    refresh_p95_ms: float
+    round_s: float
+    calls_per_refresh: float
+    calls_per_hour: float
+    writes_per_refresh: float
+    writes_per_tick: float
+    loop_max_lag_ms: float
+    loop_blocked_ms: float
+    memory_kib: float
+    failed_updates: int
+
+
+def percentile(values: list[float], share: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+def select_first_areas(result) -> dict:
+    # Keep the first stop area proposed for each station
+    return {key: key.default() for key in result["data_schema"].schema}
+
+
+async def async_add_route(hass, url: str, index: int, args) -> tuple[float, float]:
+    """Add a route through the config flow, return the time of the flow and of the setup.
+
+    With multi_route, the routes of an API key are added to a single entry
+    through its options flow, the setup time being the reload of the entry.
+    """
+    start = station_code("S", index // ROUTES_PER_START)
+    end = station_code("T", index % ROUTES_PER_START)
+    key = f"key-{index // args.routes_per_key}"
+    connection = {"url": url, "region": "sncf", "api_key": key}
+    journey = {
+        "journey": args.journeys,
+        "scan_interval": args.scan_interval,
+        "prefetch_journeys": args.prefetch,
+        "max_transfers": args.max_transfers,
+        "last_journey": args.last_journey,
+        "bidirectional": args.bidirectional,
+        "adaptive_polling": args.adaptive_polling,
+        "batch_refresh": args.batch_refresh,
+        "daily_quota": args.daily_quota
+    }
+
+    flow = hass.config_entries.flow
+    started = perf_counter()
+    if args.multi_route:
+        entry = next((entry for entry in hass.config_entries.async_entries(DOMAIN) if entry.title == key), None)
+        if entry is None:
+            result = await flow.async_init(DOMAIN, context={"source": config_entries.SOURCE_USER})
+            result = await flow.async_configure(result["flow_id"], connection)
+            result = await flow.async_configure(result["flow_id"], {"next_step_id": "routes"})
+            result = await flow.async_configure(result["flow_id"], {"name": key, **journey})
+            await hass.async_block_till_done()
+            entry = result["result"]
+
+        flow = hass.config_entries.options
+        result = await flow.async_init(entry.entry_id)
+        result = await flow.async_configure(result["flow_id"], {"next_step_id": "add_route"})
+        result = await flow.async_configure(result["flow_id"], {"from": start, "to": end})
+        flow_time = perf_counter() - started
+
+        started = perf_counter()
+        result = await flow.async_configure(result["flow_id"], select_first_areas(result))
+        await hass.async_block_till_done()
+        if result["type"] != "create_entry":
+            raise RuntimeError(f"Options flow of route {index} failed: {result}")
+        return flow_time, perf_counter() - started
+
+    result = await flow.async_init(DOMAIN, context={"source": config_entries.SOURCE_USER})
+    result = await flow.async_configure(result["flow_id"], connection)
+    result = await flow.async_configure(result["flow_id"], {"next_step_id": "start_end"})
+    result = await flow.async_configure(result["flow_id"], {"from": start, "to": end})
+    result = await flow.async_configure(result["flow_id"], select_first_areas(result))
+    flow_time = perf_counter() - started
+
+    started = perf_counter()
+    result = await flow.async_configure(result["flow_id"], journey)
+    await hass.async_block_till_done()
+    if result["type"] != "create_entry":
+        raise RuntimeError(f"Config flow of route {index} failed: {result}")
+    return flow_time, perf_counter() - started
+
+
+async def async_benchmark(routes: int, args) -> Result:
+    # Errors are only injected in the measured refreshes, the flows of the routes do not retry their searches
+    api = FakeSncfApi(args.latency, args.jitter, 0.0, args.disruption_rate, args.seed)
+    url = await api.async_start()
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = await async_test_home_assistant(asyncio.get_running_loop())
+        hass.config.config_dir = config_dir
+        hass.config.set_time_zone("Europe/Paris")
+        # Let the loader find the integration of this repository
+        hass.data.pop(loader.DATA_CUSTOM_COMPONENTS)
+
+        monitor = LoopMonitor()
+        with WriteCounter() as counter:
+            try:
+                gc.collect()
+                tracemalloc.start()
+                memory = tracemalloc.get_traced_memory()[0]
+
+                flow_times = []
+                flow_calls = 0
+                setup_times = []
+                setup_calls = 0
+                for index in range(routes):
+                    calls = api.requests
+                    flow_time, setup_time = await async_add_route(hass, url, index, args)
+                    flow_times.append(flow_time)
+                    setup_times.append(setup_time)
+                    # Calls of the flow can not be told apart from the ones of the setup it triggers
+                    setup_calls += api.requests - calls
+                await hass.async_block_till_done()
+
+                gc.collect()
+                memory = tracemalloc.get_traced_memory()[0] - memory
+                tracemalloc.stop()
+
+                entries = [
+                    route
+                    for entry in hass.config_entries.async_entries(DOMAIN)
+                    for route in routes_data(hass.data[DOMAIN][entry.entry_id])
+                ]
+                next_coordinators = [route[CONF_NEXT_JOURNEY] for route in entries]
+                # Last journeys and return directions, counted in the calls per hour of their route
+                other_coordinators = [
+                    (index, coordinator)
+                    for index, route in enumerate(entries)
+                    for coordinator in route_coordinators(route)
+                    if coordinator is not route[CONF_NEXT_JOURNEY]
+                ]
+
+                # Searches of the first flow of each station are the only ones reaching the API
+                flow_calls = api.calls["places"]
+
+                # Routes restored from their cached journeys have not queried the API yet, warm its caches first
+                await asyncio.gather(*(coordinator.async_refresh() for coordinator in next_coordinators))
+                await hass.async_block_till_done()
+
+                api.error_rate = args.error_rate
+                monitor.start()
+                latencies = []
+                round_times = []
+                next_requests = {id(coordinator): coordinator.metrics.requests for coordinator in next_coordinators}
+                failures = sum(coordinator.metrics.update_failures for coordinator in next_coordinators)
+                writes = counter.writes
+                for _ in range(args.rounds):
+                    started = perf_counter()
+                    await asyncio.gather(*(coordinator.async_refresh() for coordinator in next_coordinators))
+                    await hass.async_block_till_done()
+                    round_times.append(perf_counter() - started)
+                    latencies.extend(coordinator.metrics.last_update_time for coordinator in next_coordinators)
+                refresh_writes = counter.writes - writes
+
+                calls_per_refresh = [
+                    (coordinator.metrics.requests - next_requests[id(coordinator)]) / args.rounds
+                    for coordinator in next_coordinators
+                ]
+                calls_per_hour = [
+                    calls * 3600 / max(coordinator.refresh_interval.total_seconds(), 1)
+                    for calls, coordinator in zip(calls_per_refresh, next_coordinators)
+                ]
+
+                # Coordinators of a route share its metrics, refresh them one by one to count the requests of each
+                for index, coordinator in other_coordinators:
+                    requests = coordinator.metrics.requests
+                    await coordinator.async_refresh()
+                    await hass.async_block_till_done()
+                    calls_per_hour[index] += (coordinator.metrics.requests - requests) * 3600 / max(coordinator.refresh_interval.total_seconds(), 1)
+
+                writes = counter.writes
+                now = dt_util.utcnow()
+                for coordinator in next_coordinators:
+                    coordinator._async_tick(now)
+                await hass.async_block_till_done()
+                tick_writes = counter.writes - writes
+                failures = sum(coordinator.metrics.update_failures for coordinator in next_coordinators) - failures
+            finally:
+                if tracemalloc.is_tracing():
+                    tracemalloc.stop()
+                if monitor._task is not None:
+                    await monitor.stop()
+                await hass.async_stop(force=True)
+                await api.async_stop()
+
+    return Result(
+        routes=routes,
+        flow_ms=statistics.mean(flow_times) * 1000,
+        flow_calls=flow_calls / routes,
+        setup_ms=statistics.mean(setup_times) * 1000,
+        setup_calls=(setup_calls - flow_calls) / routes,
+        refresh_p50_ms=statistics.median(latencies) * 1000 if latencies else 0.0,
+        refresh_p95_ms=percentile(latencies, 0.95) * 1000,
+        round_s=statistics.mean(round_times) if round_times else 0.0,
+        calls_per_refresh=statistics.mean(calls_per_refresh),
+        calls_per_hour=statistics.mean(calls_per_hour),
+        writes_per_refresh=refresh_writes / args.rounds / routes,
+        writes_per_tick=tick_writes / routes,
+        loop_max_lag_ms=monitor.max_lag * 1000,
+        loop_blocked_ms=monitor.blocked * 1000,
+        memory_kib=memory / routes / 1024,
+        failed_updates=failures
+    )
+
+
+def format_results(results: list[Result]) -> str:
+    names = [field.name for field in fields(Result)]
+    rows = [names] + [
+        [f"{value:.2f}" if isinstance(value, float) else str(value) for value in (getattr(result, name) for name in names)]
+        for result in results
+    ]
+    widths = [max(len(row[column]) for row in rows) for column in range(len(names))]
+    return "\n".join("  ".join(cell.rjust(width) for cell, width in zip(row, widths)) for row in rows)
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--routes", type=int, nargs="+", default=[1, 10, 100, 500], help="numbers of routes to benchmark")
+    parser.add_argument("--rounds", type=int, default=3, help="refreshes of every route measured")
+    parser.add_argument("--routes-per-key", type=int, default=10, help="routes sharing an API key")
+    parser.add_argument("--journeys", type=int, default=1, help="next journeys of a route")
+    parser.add_argument("--scan-interval", type=int, default=720, help="refresh rate of a route in seconds")
+    parser.add_argument("--prefetch", type=int, default=0, help="extra journeys fetched ahead")
+    parser.add_argument("--max-transfers", type=int, default=0, help="maximum number of connections")
+    parser.add_argument("--last-journey", action="store_true", help="add the last journey of the day")
+    parser.add_argument("--bidirectional", action="store_true", help="also follow the return journeys of each route")
+    parser.add_argument("--adaptive-polling", action="store_true", help="adapt the refresh rate to the timetable")
+    parser.add_argument("--batch-refresh", action="store_true", help="refresh the routes of an API key together")
+    parser.add_argument("--multi-route", action="store_true", help="add the routes of an API key to a single multi-route entry")
+    parser.add_argument("--daily-quota", type=int, default=1000000, help="daily quota of an API key")
+    parser.add_argument("--latency", type=float, default=0.05, help="mean latency of the fake API in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="latency variation of the fake API in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of the requests of the measured refreshes failing")
+    parser.add_argument("--disruption-rate", type=float, default=0.1, help="share of delayed journeys")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the latency, errors and disruptions")
+    parser.add_argument("--output", help="also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the logs of the integration")
+    return parser.parse_args(argv)
+
+
+async def async_main(args: argparse.Namespace) -> list[Result]:
+    results = []
+    for routes in args.routes:
+        results.append(await async_benchmark(routes, args))
+        print(format_results(results[-1:]).splitlines()[-1] if len(results) > 1 else format_results(results), flush=True)
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+
+    results = asyncio.run(async_main(args))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(format_results(results) + "\n")
+
+
+if __name__ == "__main__":
+    main()
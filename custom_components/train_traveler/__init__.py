@@ -1,42 +1,240 @@
+import asyncio
 import logging
+from datetime import datetime
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CONF_URL, CONF_REGION, CONF_API_KEY
+from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers.event import async_call_later, async_track_time_change
+from homeassistant.helpers.storage import Store
 
-from .const import DOMAIN, PLATFORMS, CONF_LAST_JOURNEY, CONF_NEXT_JOURNEY
+from .const import (
+    DOMAIN,
+    VERSION,
+    PLATFORMS,
+    DEFAULT_MAX_CONCURRENT_REFRESH,
+    CONF_LAST_JOURNEY,
+    CONF_NEXT_JOURNEY,
+    CONF_RETURN_NEXT_JOURNEY,
+    CONF_RETURN_LAST_JOURNEY,
+    CONF_CONNECTION,
+    CONF_BATCH_REFRESH,
+    CONF_MAX_CONCURRENT_REFRESH,
+    DATA_METRICS,
+    DATA_ROUTES,
+    DATA_ROUTE_RETRIES
+)
+from .api import SncfApiClient, async_get_client, async_release_client
 from .coordinator import JourneyCoordinator
-
-from sncf.connections.connection_manager import ApiConnectionManager
+from .scheduler import async_get_scheduler, async_remove_from_scheduler
+from .disruptions import async_drop_disruption_feed
+from .resilience import backoff_delay
+from .store import STORAGE_VERSION, storage_key
+from .metrics import RouteMetrics
+from .webhook import async_update_webhook, async_remove_webhook
+from .routes import is_multi_route, entry_route_ids, route_config, route_key, route_journeys, route_coordinators, routes_data
 
 _LOGGER = logging.getLogger(__name__)
 
 
+async def async_setup_route(
+        hass: HomeAssistant, entry: ConfigEntry, client: SncfApiClient, route_id: str | None = None
+) -> dict:
+    """Set up the coordinators of a route, the routes of a multi-route entry share the minute tick of the entry.
+
+    A bidirectional route also follows the journeys from its end area back
+    to its start area, on the same device.
+    """
+    route = {CONF_CONNECTION: client}
+    # Shared by the coordinators of the route
+    metrics = route[DATA_METRICS] = RouteMetrics()
+
+    coordinator_types = {
+        (False, False): CONF_NEXT_JOURNEY,
+        (True, False): CONF_LAST_JOURNEY,
+        (False, True): CONF_RETURN_NEXT_JOURNEY,
+        (True, True): CONF_RETURN_LAST_JOURNEY
+    }
+    for last_journey, reverse in route_journeys(route_config(entry, route_id)):
+        coordinator_type = coordinator_types[(last_journey, reverse)]
+        _LOGGER.info("Add coordinator for %s", coordinator_type)
+        coordinator = JourneyCoordinator(client, hass, entry, last_journey=last_journey, metrics=metrics, route_id=route_id, reverse=reverse)
+        await coordinator.async_setup(tick=route_id is None)
+        route[coordinator_type] = coordinator
+
+    return route
+
+
+@callback
+def _async_setup_route_devices(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Add the device of a multi-route entry and remove the devices of its removed routes."""
+    device_registry = dr.async_get(hass)
+    device_registry.async_get_or_create(
+        config_entry_id=entry.entry_id,
+        identifiers={(DOMAIN, entry.entry_id)},
+        name=entry.title,
+        sw_version=VERSION
+    )
+
+    identifiers = {(DOMAIN, entry.entry_id)} | {(DOMAIN, route_key(entry.entry_id, route_id)) for route_id in entry_route_ids(entry)}
+    for device in dr.async_entries_for_config_entry(device_registry, entry.entry_id):
+        if not device.identifiers & identifiers:
+            _LOGGER.debug("Remove device %s of a removed route", device.name)
+            device_registry.async_remove_device(device.id)
+
+
+def _async_setup_routes_results(entry: ConfigEntry, route_ids: list[str], results: list) -> dict:
+    """Keep the routes of a multi-route entry which were set up, the others are set up again when the entry is reloaded.
+
+    Raise ConfigEntryNotReady when none was, setup is then retried.
+    """
+    routes = {}
+    for route_id, result in zip(route_ids, results):
+        if isinstance(result, BaseException):
+            if not isinstance(result, Exception):
+                raise result
+            _LOGGER.warning("Route %s of %s could not be set up, it is retried later: %s", route_id, entry.title, result)
+            continue
+        routes[route_id] = result
+
+    if route_ids and not routes:
+        raise ConfigEntryNotReady(f"No route of {entry.title} could be set up") from results[0]
+    return routes
+
+
+@callback
+def _async_retry_failed_routes(hass: HomeAssistant, entry: ConfigEntry, failed: bool) -> None:
+    """Reload an entry later when some of its routes could not be set up.
+
+    Routes set up are restored from their cached journeys when reloading.
+    The delay backs off with consecutive reloads still failing.
+    """
+    retries = hass.data[DOMAIN].setdefault(DATA_ROUTE_RETRIES, {})
+    if not failed:
+        retries.pop(entry.entry_id, None)
+        return
+
+    failures = retries[entry.entry_id] = retries.get(entry.entry_id, 0) + 1
+    delay = backoff_delay(failures)
+    _LOGGER.info("Reload %s in %s to set up its failed routes", entry.title, delay)
+
+    @callback
+    def async_retry(now: datetime) -> None:
+        hass.async_create_task(hass.config_entries.async_reload(entry.entry_id))
+
+    entry.async_on_unload(async_call_later(hass, delay, async_retry))
+
+
+async def async_update_options(
+        hass: HomeAssistant,
+        entry: ConfigEntry
+) -> None:
+
+    """Apply the options of an entry to its running coordinators.
+
+    The entry is only reloaded when routes, last journeys or return
+    directions were added or removed, the routes kept being restored from
+    their cached journeys.
+    """
+    entry_data = hass.data[DOMAIN].get(entry.entry_id)
+    if entry_data is None:
+        return
+
+    routes = {route[CONF_NEXT_JOURNEY].route_id: route for route in routes_data(entry_data)}
+    route_ids = entry_route_ids(entry)
+    journeys = {route_id: route_journeys(route_config(entry, route_id)) for route_id in route_ids}
+    if set(routes) != set(route_ids) or any(
+        journeys[route_id] != [(coordinator.last_journey, coordinator.reverse) for coordinator in route_coordinators(route)]
+        for route_id, route in routes.items()
+    ):
+        # Cached journeys are saved when the entry is unloaded, remove the ones of the routes and journeys dropped afterwards
+        removed = [
+            (route_id, coordinator.last_journey, coordinator.reverse)
+            for route_id, route in routes.items()
+            for coordinator in route_coordinators(route)
+            if (coordinator.last_journey, coordinator.reverse) not in journeys.get(route_id, [])
+        ]
+        await hass.config_entries.async_reload(entry.entry_id)
+
+        for route_id, last_journey, reverse in removed:
+            await Store(hass, STORAGE_VERSION, storage_key(route_key(entry.entry_id, route_id), last_journey, reverse)).async_remove()
+        return
+
+    async_update_webhook(hass, entry, entry_data)
+
+    # Options also change when the timezone of a route is saved, coordinators ignore what they already use
+    refresh = [
+        coordinator
+        for route in routes.values()
+        for coordinator in route_coordinators(route)
+        if coordinator.async_update_config()
+    ]
+    if is_multi_route(entry) or entry.data.get(CONF_BATCH_REFRESH, False):
+        async_get_scheduler(hass, entry_data[CONF_CONNECTION]).async_reschedule()
+
+    for coordinator in refresh:
+        await coordinator.async_request_refresh()
+
+
 async def async_setup_entry(
         hass: HomeAssistant, entry: ConfigEntry
 ) -> bool:
-    
+
     _LOGGER.info("Initializing %s integration with platforms: %s and config: %s", DOMAIN, PLATFORMS, entry)
 
     hass.data.setdefault(DOMAIN, {})
     hass.data[DOMAIN][entry.entry_id] = {}
 
-    _LOGGER.info("Add coordinator for next journey")
-    connection = ApiConnectionManager(
-        entry.data[CONF_URL],
-        entry.data[CONF_API_KEY],
-        entry.data[CONF_REGION]
-    )
+    client = async_get_client(hass, entry.data)
+    hass.data[DOMAIN][entry.entry_id][CONF_CONNECTION] = client
+
+    try:
+        await client.limiter.async_restore()
+        if is_multi_route(entry):
+            route_ids = entry_route_ids(entry)
+            _LOGGER.info("Add coordinators for %s routes", len(route_ids))
+            results = await asyncio.gather(
+                *[async_setup_route(hass, entry, client, route_id) for route_id in route_ids],
+                return_exceptions=True
+            )
+            set_up = hass.data[DOMAIN][entry.entry_id][DATA_ROUTES] = _async_setup_routes_results(entry, route_ids, results)
+            _async_retry_failed_routes(hass, entry, len(set_up) < len(route_ids))
+        else:
+            hass.data[DOMAIN][entry.entry_id].update(await async_setup_route(hass, entry, client))
+    except Exception:
+        # Setup will be retried, do not keep a reference on the shared client meanwhile
+        hass.data[DOMAIN].pop(entry.entry_id)
+        await async_release_client(hass, client)
+        async_drop_disruption_feed(hass, client)
+        raise
+
+    routes = routes_data(hass.data[DOMAIN][entry.entry_id])
+
+    # Routes of a multi-route entry are always refreshed in the same pass, by a single timer
+    if is_multi_route(entry) or entry.data.get(CONF_BATCH_REFRESH, False):
+        _LOGGER.info("Refresh journeys together with the other routes of this connection")
+        scheduler = async_get_scheduler(hass, client)
+        for route in routes:
+            for coordinator in route_coordinators(route):
+                scheduler.async_add(
+                    coordinator,
+                    entry.data.get(CONF_MAX_CONCURRENT_REFRESH, DEFAULT_MAX_CONCURRENT_REFRESH)
+                )
 
-    next_journey_coordinator = JourneyCoordinator(connection, hass, entry)
-    await next_journey_coordinator.async_config_entry_first_refresh()
-    hass.data[DOMAIN][entry.entry_id][CONF_NEXT_JOURNEY] = next_journey_coordinator
+    if is_multi_route(entry):
+        _async_setup_route_devices(hass, entry)
 
-    if entry.data[CONF_LAST_JOURNEY]:
-        _LOGGER.info("Add coordinator for last journey")
-        last_journey_coordinator = JourneyCoordinator(connection, hass, entry, last_journey=True)
-        await last_journey_coordinator.async_config_entry_first_refresh()
-        hass.data[DOMAIN][entry.entry_id][CONF_LAST_JOURNEY] = last_journey_coordinator
+        @callback
+        def async_tick(now: datetime) -> None:
+            for route in routes:
+                for coordinator in route_coordinators(route):
+                    coordinator._async_tick(now)
+
+        entry.async_on_unload(async_track_time_change(hass, async_tick, second=0))
+
+    async_update_webhook(hass, entry, hass.data[DOMAIN][entry.entry_id])
+    entry.async_on_unload(entry.add_update_listener(async_update_options))
 
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
@@ -44,12 +242,32 @@ async def async_setup_entry(
 
 
 async def async_unload_entry(
-        hass: HomeAssistant, 
+        hass: HomeAssistant,
         entry: ConfigEntry
 ) -> bool:
-    
+
     """Unload a config entry."""
     unload = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload:
-        hass.data[DOMAIN].pop(entry.entry_id)
-    return unload
\ No newline at end of file
+        entry_data = hass.data[DOMAIN].pop(entry.entry_id)
+        async_remove_webhook(hass, entry_data)
+        for route in routes_data(entry_data):
+            for coordinator in route_coordinators(route):
+                async_remove_from_scheduler(hass, entry_data[CONF_CONNECTION], coordinator)
+                await coordinator.async_flush()
+        await async_release_client(hass, entry_data[CONF_CONNECTION])
+        async_drop_disruption_feed(hass, entry_data[CONF_CONNECTION])
+    return unload
+
+
+async def async_remove_entry(
+        hass: HomeAssistant,
+        entry: ConfigEntry
+) -> None:
+
+    """Remove the journeys cached for a config entry."""
+    hass.data.get(DOMAIN, {}).get(DATA_ROUTE_RETRIES, {}).pop(entry.entry_id, None)
+    for route_id in entry_route_ids(entry):
+        for last_journey in (False, True):
+            for reverse in (False, True):
+                await Store(hass, STORAGE_VERSION, storage_key(route_key(entry.entry_id, route_id), last_journey, reverse)).async_remove()
@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime
+from functools import partial
+import json
+import logging
+import time
+
+import aiohttp
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.const import CONF_URL, CONF_REGION, CONF_API_KEY
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+from .const import DOMAIN, DATA_CLIENTS, DEFAULT_STATIC_CACHE_TTL, DEFAULT_DAILY_QUOTA, CONF_DAILY_QUOTA
+from .metrics import RequestMetrics, route_metrics
+from .ratelimit import RateLimiter
+from .store import QUOTA_STORAGE_VERSION, QuotaStore, quota_storage_key
+from .resilience import CircuitBreaker
+
+from sncf.connections.connection_manager import ApiConnectionManager
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def client_key(config) -> tuple:
+    """Return the key identifying a client in the registry."""
+    return (config[CONF_URL], config[CONF_REGION], config[CONF_API_KEY])
+
+
+def request_key(query: str, parameters: dict) -> tuple:
+    """Return a hashable key for a query and its parameters."""
+    return (query, tuple(sorted(
+        (key, tuple(value) if isinstance(value, list) else value) for key, value in parameters.items()
+    )))
+
+
+def format_parameters(parameters: dict) -> list[tuple[str, str]]:
+    """Convert query parameters to the flat list of strings aiohttp expects."""
+    formatted = []
+    for key, value in parameters.items():
+        for item in (value if isinstance(value, list) else [value]):
+            if isinstance(item, bool):
+                item = "true" if item else "false"
+            elif isinstance(item, datetime):
+                item = item.strftime("%Y%m%dT%H%M%S")
+            formatted.append((key, str(item)))
+    return formatted
+
+
+class SncfApiError(Exception):
+    """Error returned by the SNCF API."""
+
+    def __init__(self, status: int, payload: dict | None):
+        super().__init__(payload if payload else f"HTTP error {status}")
+        self.status = status
+        self.payload = payload
+
+    @property
+    def error_id(self) -> str | None:
+        if isinstance(self.payload, dict) and isinstance(self.payload.get("error"), dict):
+            return self.payload["error"].get("id")
+        return None
+
+    @property
+    def failed(self) -> bool:
+        """Return False for errors which are regular answers, like no journey found."""
+        return self.error_id != "no_solution"
+
+    @property
+    def unavailable(self) -> bool:
+        """Return True when the API itself is failing, not the request."""
+        return self.status >= 500 or self.status == 429
+
+
+@dataclass(slots=True)
+class InFlightRequest:
+    """A request being sent, with the number of callers waiting for it."""
+
+    task: asyncio.Task
+    waiters: int = 0
+
+
+class SncfApiClient(object):
+    """HTTP client shared by every config entry using the same SNCF credentials.
+
+    Requests go through Home Assistant's aiohttp session and identical
+    requests running at the same time are only sent once. Requests are counted in
+    metrics, and in the metrics of the route being refreshed, and go
+    through the rate limiter of the API key and a circuit breaker.
+
+    Clients are created from the event loop, blocking requests sent from
+    other threads are run on it.
+    """
+
+    def __init__(
+            self, connection: ApiConnectionManager, websession: aiohttp.ClientSession, limiter: RateLimiter | None = None
+    ):
+        self.connection = connection
+        self.key = (connection.root_url, connection.region, connection.api_key)
+        self.references = 0
+        self.metrics = RequestMetrics()
+        self.limiter = limiter if limiter is not None else RateLimiter()
+        self.breaker = CircuitBreaker()
+
+        self._loop = asyncio.get_running_loop()
+        self._websession = websession
+        self._auth = aiohttp.BasicAuth(connection.api_key, '')
+        self._async_in_flight: dict[tuple, InFlightRequest] = {}
+        self._static_cache: dict[tuple, tuple[float, object]] = {}
+
+    @property
+    def request_count(self) -> int:
+        return self.metrics.requests
+
+    def _metrics(self) -> tuple[RequestMetrics, ...]:
+        return (self.metrics, *route_metrics())
+
+    def _record_request(self, latency: float, size: int, failed: bool) -> None:
+        for metrics in self._metrics():
+            metrics.record_request(latency, size, failed)
+
+    def _record_cache(self, hit: bool) -> None:
+        for metrics in self._metrics():
+            if hit:
+                metrics.cache_hits += 1
+            else:
+                metrics.cache_misses += 1
+
+    async def async_get(self, query: str, parameters: dict = {}) -> dict:
+        """Fetch a query and return its decoded JSON payload.
+
+        The request runs in its own task, so a caller being cancelled does
+        not cancel it for the other callers waiting for it. It is only
+        cancelled once no caller waits for it anymore.
+        """
+        key = request_key(query, parameters)
+
+        request = self._async_in_flight.get(key)
+        if request is not None:
+            _LOGGER.debug("Joining in-flight request %s", query)
+            for metrics in self._metrics():
+                metrics.joined += 1
+        else:
+            # The task runs in a copy of the context, requests are counted in the metrics of the route of the caller
+            task = asyncio.get_running_loop().create_task(self._async_fetch(query, parameters))
+            request = self._async_in_flight[key] = InFlightRequest(task)
+            task.add_done_callback(partial(self._async_request_done, key, request))
+
+        request.waiters += 1
+        try:
+            return await asyncio.shield(request.task)
+        finally:
+            request.waiters -= 1
+            if request.waiters == 0 and not request.task.done():
+                request.task.cancel()
+
+    def get(self, query: str, parameters: dict = {}) -> dict:
+        """Blocking version of async_get, for the blocking methods of the sncf library.
+
+        Only usable from a worker thread: the request is sent from the event
+        loop, like the asynchronous ones.
+        """
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            raise RuntimeError(f"Blocking request of {query} sent from the event loop, use async_get")
+
+        return asyncio.run_coroutine_threadsafe(self.async_get(query, parameters), self._loop).result()
+
+    def _async_request_done(self, key: tuple, request: InFlightRequest, task: asyncio.Task) -> None:
+        if self._async_in_flight.get(key) is request:
+            del self._async_in_flight[key]
+        # Avoid "exception was never retrieved" warnings when every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    async def _async_fetch(self, query: str, parameters: dict) -> dict:
+        self.breaker.before_request()
+        try:
+            await self.limiter.async_acquire()
+        except BaseException:
+            self.breaker.record_cancel()
+            raise
+
+        started = time.monotonic()
+        size = 0
+        try:
+            async with self._websession.get(query, params=format_parameters(parameters), auth=self._auth) as response:
+                body = await response.read()
+                size = len(body)
+                try:
+                    payload = json.loads(body)
+                except ValueError:
+                    payload = None
+
+                if response.status >= 400:
+                    raise SncfApiError(response.status, payload)
+        except SncfApiError as err:
+            self._record_request(time.monotonic() - started, size, err.failed)
+            if err.unavailable:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        except asyncio.CancelledError:
+            self.breaker.record_cancel()
+            raise
+        except Exception:
+            self._record_request(time.monotonic() - started, size, True)
+            self.breaker.record_failure()
+            raise
+
+        self._record_request(time.monotonic() - started, size, False)
+        self.breaker.record_success()
+        return payload
+
+    async def async_cached(self, key: tuple, fetch, ttl: int = DEFAULT_STATIC_CACHE_TTL):
+        """Return the value cached for key, or await fetch, a coroutine function, and cache its result for ttl seconds."""
+        now = time.monotonic()
+        entry = self._static_cache.get(key)
+        self._record_cache(entry is not None and entry[0] > now)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        value = await fetch()
+        self._store_cached(key, value, now + ttl)
+        return value
+
+    def _store_cached(self, key: tuple, value, expires: float) -> None:
+        now = time.monotonic()
+        for expired_key in [cached_key for cached_key, entry in self._static_cache.items() if entry[0] <= now]:
+            del self._static_cache[expired_key]
+        self._static_cache[key] = (expires, value)
+
+    def close(self) -> None:
+        self._static_cache.clear()
+
+
+@callback
+def async_get_client(hass: HomeAssistant, config) -> SncfApiClient:
+    """Return the shared client for these credentials and take a reference on it."""
+    clients: dict[tuple, SncfApiClient] = hass.data[DOMAIN].setdefault(DATA_CLIENTS, {})
+    key = client_key(config)
+
+    client = clients.get(key)
+    if client is None:
+        _LOGGER.debug("Creating shared client for %s (%s)", config[CONF_URL], config[CONF_REGION])
+        client = SncfApiClient(ApiConnectionManager(
+            config[CONF_URL],
+            config[CONF_API_KEY],
+            config[CONF_REGION]
+        ), async_get_clientsession(hass), RateLimiter(store=QuotaStore(hass, QUOTA_STORAGE_VERSION, quota_storage_key(key))))
+        clients[key] = client
+        client.limiter.daily_quota = config.get(CONF_DAILY_QUOTA, DEFAULT_DAILY_QUOTA)
+    else:
+        # Entries sharing an API key may set different quotas, the lowest one is kept
+        client.limiter.daily_quota = min(client.limiter.daily_quota, config.get(CONF_DAILY_QUOTA, DEFAULT_DAILY_QUOTA))
+
+    client.references += 1
+    return client
+
+
+@callback
+def async_get_flow_client(hass: HomeAssistant, config) -> SncfApiClient:
+    """Return a client for a config flow, the shared one when an entry already uses these credentials.
+
+    No reference is taken: a client created for a flow is never registered.
+    """
+    client = hass.data.get(DOMAIN, {}).get(DATA_CLIENTS, {}).get(client_key(config))
+    if client is not None:
+        return client
+    return SncfApiClient(ApiConnectionManager(
+        config[CONF_URL],
+        config[CONF_API_KEY],
+        config[CONF_REGION]
+    ), async_get_clientsession(hass))
+
+
+async def async_release_client(hass: HomeAssistant, client: SncfApiClient) -> None:
+    """Drop a reference on a shared client and close it once unused."""
+    client.references -= 1
+    if client.references > 0:
+        return
+
+    _LOGGER.debug("Closing shared client for %s (%s)", client.connection.root_url, client.connection.region)
+    hass.data[DOMAIN][DATA_CLIENTS].pop(client.key, None)
+    client.close()
+    await client.limiter.async_flush()
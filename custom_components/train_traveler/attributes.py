@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from .const import (
+    ATTR_JOURNEYS_LIST,
+    ATTR_STALE,
+    ATTR_FETCHED_AT,
+    ATTR_LINE_JOURNEY,
+    ATTR_DIRECTION_JOURNEY,
+    ATTR_DEPARTURE_JOURNEY,
+    ATTR_ARRIVAL_JOURNEY,
+    ATTR_DEPARTURE_TIME_JOURNEY,
+    ATTR_ARRIVAL_TIME_JOURNEY,
+    ATTR_DURATION_JOURNEY,
+    ATTR_PHYSICAL_MODE_JOURNEY,
+    ATTR_DELAY_JOURNEY,
+    ATTR_ARRIVAL_DELAY_JOURNEY,
+    ATTR_TRANSFERS_JOURNEY,
+    ATTR_TRANSFER_SLACK_JOURNEY,
+    ATTR_LEGS_LIST,
+    ATTR_DISRUPTIONS_LIST,
+    ATTR_DISRUPTION_TYPE,
+    ATTR_DISRUPTION_MESSAGE
+)
+
+from .snapshot import LegSnapshot, JourneySnapshot, RouteSnapshot
+
+
+def journey_attributes(data: JourneySnapshot, start_label: str, end_label: str) -> dict:
+    """Attributes of the sensor of a journey."""
+    return {
+        ATTR_LINE_JOURNEY: data.line,
+        ATTR_DIRECTION_JOURNEY: data.direction,
+        ATTR_DEPARTURE_TIME_JOURNEY: data.departure,
+        ATTR_ARRIVAL_TIME_JOURNEY: data.arrival,
+        ATTR_DURATION_JOURNEY: data.duration,
+        ATTR_PHYSICAL_MODE_JOURNEY: data.mode,
+        ATTR_DEPARTURE_JOURNEY: start_label,
+        ATTR_ARRIVAL_JOURNEY: end_label,
+        ATTR_TRANSFERS_JOURNEY: data.transfers,
+        ATTR_TRANSFER_SLACK_JOURNEY: data.transfer_slack
+    }
+
+
+def leg_attributes(leg: LegSnapshot) -> dict:
+    return {
+        ATTR_LINE_JOURNEY: leg.line,
+        ATTR_DIRECTION_JOURNEY: leg.direction,
+        ATTR_PHYSICAL_MODE_JOURNEY: leg.mode,
+        ATTR_DEPARTURE_JOURNEY: leg.start,
+        ATTR_DEPARTURE_TIME_JOURNEY: leg.departure,
+        ATTR_ARRIVAL_JOURNEY: leg.end,
+        ATTR_ARRIVAL_TIME_JOURNEY: leg.arrival,
+        ATTR_DELAY_JOURNEY: leg.delay,
+        ATTR_ARRIVAL_DELAY_JOURNEY: leg.arrival_delay
+    }
+
+
+def journey_details(data: JourneySnapshot, attributes: dict) -> dict:
+    """Attributes of a journey in the list of the journeys sensor."""
+    return {
+        **attributes,
+        ATTR_DISRUPTIONS_LIST: [
+            {
+                ATTR_DISRUPTION_TYPE: disruption.effect,
+                ATTR_DISRUPTION_MESSAGE: disruption.message
+            }
+            for disruption in data.disruptions
+        ],
+        ATTR_DELAY_JOURNEY: data.delay,
+        ATTR_ARRIVAL_DELAY_JOURNEY: data.arrival_delay,
+        ATTR_LEGS_LIST: [leg_attributes(leg) for leg in data.legs]
+    }
+
+
+class JourneysAttributes(object):
+    """Attributes of the sensors of a route, built once per refresh.
+
+    Entities return these dicts as they are, attributes of the journeys which
+    did not change during a refresh are kept from the previous one.
+
+    While the API is failing and the last journeys are served, attributes
+    tell they are stale and when they were fetched.
+    """
+
+    __slots__ = ("journeys", "details", "payload", "_attributes")
+
+    def __init__(self):
+        self.journeys: list[dict] = []
+        self.details: list[dict] = []
+        self.payload: dict = {ATTR_JOURNEYS_LIST: []}
+        self._attributes: list[dict] = []
+
+    def update(self, journeys: RouteSnapshot, changed: set[int]) -> None:
+        start_label = journeys.start.label
+        end_label = journeys.end.label
+
+        attributes = []
+        details = []
+        for index, data in enumerate(journeys.journeys):
+            if index in changed or index >= len(self._attributes):
+                attributes.append(journey_attributes(data, start_label, end_label))
+                details.append(journey_details(data, attributes[-1]))
+            else:
+                attributes.append(self._attributes[index])
+                details.append(self.details[index])
+
+        self._attributes = attributes
+        self.details = details
+        self.set_stale(None)
+
+    def set_stale(self, fetched_at: datetime | None) -> None:
+        """Flag the attributes as stale since fetched_at, or as fresh with None."""
+        if fetched_at is None:
+            self.journeys = self._attributes
+            self.payload = {ATTR_JOURNEYS_LIST: self.details}
+            return
+
+        stale = {ATTR_STALE: True, ATTR_FETCHED_AT: fetched_at}
+        self.journeys = [{**attributes, **stale} for attributes in self._attributes]
+        self.payload = {ATTR_JOURNEYS_LIST: self.details, **stale}
@@ -9,12 +9,11 @@ from homeassistant.components.binary_sensor import (
 
 from .const import (
     DOMAIN, 
-    CONF_NEXT_JOURNEY, 
-    CONF_LAST_JOURNEY,
     ATTR_DISRUPTION_TYPE,
     ATTR_DISRUPTION_MESSAGE
 )
-from .journey_entity import JourneyBaseEntity
+from .journey_entity import JourneyBaseEntity, JourneyEntityManager
+from .routes import routes_data, route_coordinators
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -26,14 +25,12 @@ async def async_setup_entry(
 
     _LOGGER.debug("Calling async_setup_entry entry=%s", entry)
 
-    next_journey_coordinator = hass.data[DOMAIN][entry.entry_id][CONF_NEXT_JOURNEY]
-    entities = [DisruptionEntity(next_journey_coordinator, index, "next") for index, entity in enumerate(next_journey_coordinator.data.journeys)]
-    
-    if CONF_LAST_JOURNEY in hass.data[DOMAIN][entry.entry_id]:
-        last_journey_coordinator = hass.data[DOMAIN][entry.entry_id][CONF_LAST_JOURNEY]
-        entities.extend([DisruptionEntity(last_journey_coordinator, index, "last") for index, entity in enumerate(last_journey_coordinator.data.journeys)])
-    
-    async_add_entities(entities, True)
+    def journey_entities(coordinator, index, type):
+        return [DisruptionEntity(coordinator, index, type)]
+
+    for route in routes_data(hass.data[DOMAIN][entry.entry_id]):
+        for coordinator in route_coordinators(route):
+            JourneyEntityManager(coordinator, "last" if coordinator.last_journey else "next", journey_entities, async_add_entities).async_setup(entry)
 
 class DisruptionEntity(JourneyBaseEntity, BinarySensorEntity):
 
@@ -53,10 +50,10 @@ class DisruptionEntity(JourneyBaseEntity, BinarySensorEntity):
     def extra_state_attributes(self):
         if self._attr_is_on:
             return {
-                ATTR_DISRUPTION_TYPE: self.data.disruptions[0].severity_effect,
-                ATTR_DISRUPTION_MESSAGE: self.data.disruptions[0].messages[0]
+                ATTR_DISRUPTION_TYPE: self.data.disruptions[0].effect,
+                ATTR_DISRUPTION_MESSAGE: self.data.disruptions[0].message
             }
         return {}
     
     def update_binary_state(self):
-        return len(self.data.disruptions) > 0
\ No newline at end of file
+        return self.data.disrupted
\ No newline at end of file
@@ -1,22 +1,32 @@
 
+import asyncio
+
+import aiohttp
 import voluptuous as vol
 
 from homeassistant import config_entries, core
-from homeassistant.const import CONF_API_KEY, CONF_SCAN_INTERVAL, CONF_URL, CONF_REGION
+from homeassistant.components import webhook
+from homeassistant.const import CONF_API_KEY, CONF_SCAN_INTERVAL, CONF_URL, CONF_REGION, CONF_NAME, CONF_WEBHOOK_ID
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers import selector
+from homeassistant.util.ulid import ulid_now
 
-from sncf.connections.connection_manager import ApiConnectionManager
-from sncf.repositories.place_repository import ApiPlaceRepository
-from sncf.repositories.repository_manager import ApiRepository
-from sncf.services.info_service import InfoService
+from .api import SncfApiClient, SncfApiError, async_get_flow_client
+from .ratelimit import QuotaExceededError
+from .repositories import SharedRepository
+from .resilience import CircuitOpenError
+from .places import async_get_place_cache
+from .routes import is_multi_route, entry_settings
 
+from sncf.entities.place_entity import PlaceAreaEntity
 
 from .const import (
-    DOMAIN, 
-    DEFAULT_CONNECTION_URL, DEFAULT_CONNECTION_REGION, DEFAULT_REFRESH_RATE, DEFAULT_JOURNEY_COUNT,
+    DOMAIN, FLOW_REQUEST_TIMEOUT,
+    DEFAULT_CONNECTION_URL, DEFAULT_CONNECTION_REGION, DEFAULT_REFRESH_RATE, MIN_REFRESH_RATE, DEFAULT_JOURNEY_COUNT, DEFAULT_MAX_CONCURRENT_REFRESH, DEFAULT_CACHE_MAX_AGE, DEFAULT_DAILY_QUOTA, DEFAULT_PREFETCH_JOURNEYS, DEFAULT_MAX_TRANSFERS,
     CONF_CONNECTION, CONF_LAST_JOURNEY, CONF_FROM, CONF_TO, CONF_START_AREA, CONF_END_AREA,
-    CONF_AREAS, CONF_JOURNEYS_COUNT, CONF_AREA_NAME, CONF_AREA_COORD, CONF_AREA_ID, CONF_AREA_LABEL, CONF_PAUSE_UPDATE_EXPERIMENTAL
+    CONF_AREAS, CONF_JOURNEYS_COUNT, CONF_AREA_NAME, CONF_AREA_COORD, CONF_AREA_ID, CONF_AREA_LABEL, CONF_PAUSE_UPDATE_EXPERIMENTAL,
+    CONF_BATCH_REFRESH, CONF_MAX_CONCURRENT_REFRESH, CONF_ADAPTIVE_POLLING, CONF_CACHE_MAX_AGE, CONF_DAILY_QUOTA, CONF_PREFETCH_JOURNEYS, CONF_MAX_TRANSFERS,
+    CONF_MULTI_ROUTE, CONF_ROUTES, CONF_ROUTE_ID, CONF_BIDIRECTIONAL, CONF_DISRUPTION_WEBHOOK
 )
 
 CONNECTION_SCHEMA = vol.Schema({
@@ -33,28 +43,108 @@ AREA_SCHEMA = vol.Schema({
 
 JOURNEY_SCHEMA = vol.Schema({
     vol.Required(CONF_JOURNEYS_COUNT, default=DEFAULT_JOURNEY_COUNT): cv.positive_int,
-    vol.Required(CONF_SCAN_INTERVAL, default=DEFAULT_REFRESH_RATE): cv.positive_int,
+    vol.Required(CONF_SCAN_INTERVAL, default=DEFAULT_REFRESH_RATE): vol.All(vol.Coerce(int), vol.Range(min=MIN_REFRESH_RATE)),
+    vol.Optional(CONF_PREFETCH_JOURNEYS, default=DEFAULT_PREFETCH_JOURNEYS): cv.positive_int,
+    vol.Optional(CONF_MAX_TRANSFERS, default=DEFAULT_MAX_TRANSFERS): cv.positive_int,
     vol.Optional(CONF_LAST_JOURNEY): cv.boolean,
-    vol.Optional(CONF_PAUSE_UPDATE_EXPERIMENTAL): cv.boolean
+    vol.Optional(CONF_BIDIRECTIONAL): cv.boolean,
+    vol.Optional(CONF_PAUSE_UPDATE_EXPERIMENTAL): cv.boolean,
+    vol.Optional(CONF_ADAPTIVE_POLLING): cv.boolean,
+    vol.Optional(CONF_CACHE_MAX_AGE, default=DEFAULT_CACHE_MAX_AGE): cv.positive_int,
+    vol.Optional(CONF_BATCH_REFRESH): cv.boolean,
+    vol.Optional(CONF_MAX_CONCURRENT_REFRESH, default=DEFAULT_MAX_CONCURRENT_REFRESH): vol.All(vol.Coerce(int), vol.Range(min=1)),
+    vol.Optional(CONF_DAILY_QUOTA, default=DEFAULT_DAILY_QUOTA): vol.All(vol.Coerce(int), vol.Range(min=1))
 })
 
+ROUTES_SCHEMA = vol.Schema({
+    vol.Required(CONF_NAME, default="Routes"): cv.string
+}).extend(JOURNEY_SCHEMA.schema)
+
+
+# Errors of an API which could not be reached, not of the settings
+CONNECTION_ERRORS = (aiohttp.ClientError, TimeoutError, CircuitOpenError, QuotaExceededError)
+
+
+class CannotConnect(Exception):
+    """The API could not be reached."""
 
-async def validate_auth(connection: ApiConnectionManager, hass: core.HomeAssistant):
-    infoService: InfoService = InfoService(ApiRepository(connection=connection))
-    auth = await hass.async_add_executor_job(infoService.validate_coverage_auth)
+
+def is_connection_error(err: Exception) -> bool:
+    return isinstance(err, CONNECTION_ERRORS) or (isinstance(err, SncfApiError) and err.unavailable)
+
+
+async def validate_auth(client: SncfApiClient):
+    try:
+        async with asyncio.timeout(FLOW_REQUEST_TIMEOUT):
+            auth = await SharedRepository(client).async_validate_auth(api="coverage")
+    except Exception as err:
+        if is_connection_error(err):
+            raise CannotConnect from err
+        raise
     if not auth:
         raise ValueError
     return True    
 
-async def fetch_area(place: str, connection, hass: core.HomeAssistant):
-    place_repository = ApiPlaceRepository(connection=connection)
+async def fetch_area(place: str, client: SncfApiClient, hass: core.HomeAssistant):
     try:
-        areas = await hass.async_add_executor_job(place_repository.find_areas_from_places, place)
-    except Exception:
+        async with asyncio.timeout(FLOW_REQUEST_TIMEOUT):
+            areas = await async_get_place_cache(hass).async_find_areas(client, place)
+    except Exception as err:
+        if is_connection_error(err):
+            raise CannotConnect from err
         raise ValueError
 
+    if not areas:
+        raise ValueError
     return areas
 
+def area_config(area: PlaceAreaEntity) -> dict:
+    return {
+        CONF_AREA_ID: area.stop_area.id,
+        CONF_AREA_NAME: area.stop_area.name,
+        CONF_AREA_LABEL: area.stop_area.label,
+        CONF_AREA_COORD: {
+            "lon": area.stop_area.coord["lon"],
+            "lat": area.stop_area.coord["lat"]
+        }
+    }
+
+def selected_areas(areas: dict, user_input: dict) -> tuple[dict, dict]:
+    """Return the configuration of the stop areas picked among the ones found."""
+    start = next((area for area in areas["from_area"] if area.name == user_input[CONF_START_AREA]), None)
+    end = next((area for area in areas["to_area"] if area.name == user_input[CONF_END_AREA]), None)
+    return area_config(start), area_config(end)
+
+def areas_schema(areas: dict) -> vol.Schema:
+    return vol.Schema(
+        {
+            vol.Required(CONF_START_AREA, default=areas["from_area"][0].name): selector.SelectSelector(
+                 selector.SelectSelectorConfig(
+                     options=[area.name for area in areas["from_area"]], mode=selector.SelectSelectorMode.DROPDOWN
+                     )),
+            vol.Required(CONF_END_AREA, default=areas["to_area"][0].name): selector.SelectSelector(
+                 selector.SelectSelectorConfig(
+                     options=[area.name for area in areas["to_area"]], mode=selector.SelectSelectorMode.DROPDOWN
+                     ))
+        }
+    )
+
+def journey_settings(user_input: dict) -> dict:
+    return {
+        CONF_JOURNEYS_COUNT: user_input[CONF_JOURNEYS_COUNT],
+        CONF_SCAN_INTERVAL: user_input[CONF_SCAN_INTERVAL],
+        CONF_PREFETCH_JOURNEYS: user_input[CONF_PREFETCH_JOURNEYS],
+        CONF_MAX_TRANSFERS: user_input[CONF_MAX_TRANSFERS],
+        CONF_LAST_JOURNEY: user_input[CONF_LAST_JOURNEY] if CONF_LAST_JOURNEY in user_input else False,
+        CONF_BIDIRECTIONAL: user_input[CONF_BIDIRECTIONAL] if CONF_BIDIRECTIONAL in user_input else False,
+        CONF_PAUSE_UPDATE_EXPERIMENTAL: user_input[CONF_PAUSE_UPDATE_EXPERIMENTAL] if CONF_PAUSE_UPDATE_EXPERIMENTAL in user_input else False,
+        CONF_ADAPTIVE_POLLING: user_input[CONF_ADAPTIVE_POLLING] if CONF_ADAPTIVE_POLLING in user_input else False,
+        CONF_CACHE_MAX_AGE: user_input[CONF_CACHE_MAX_AGE],
+        CONF_BATCH_REFRESH: user_input[CONF_BATCH_REFRESH] if CONF_BATCH_REFRESH in user_input else False,
+        CONF_MAX_CONCURRENT_REFRESH: user_input[CONF_MAX_CONCURRENT_REFRESH],
+        CONF_DAILY_QUOTA: user_input[CONF_DAILY_QUOTA]
+    }
+
 class TrainTravelerConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Handle a config flow for sncf-integration."""
 
@@ -68,10 +158,13 @@ class TrainTravelerConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
         if user_input is not None:
             try:
-                connection = ApiConnectionManager(user_input[CONF_URL], user_input[CONF_API_KEY], user_input[CONF_REGION])
-                await validate_auth(connection, self.hass)
+                # Kept for the searches of the next steps
+                self._client = async_get_flow_client(self.hass, user_input)
+                await validate_auth(self._client)
             except ValueError:
                 errors["base"] = "auth_error"
+            except CannotConnect:
+                errors["base"] = "cannot_connect"
             if not errors:
                 self.data = user_input
                 self.data[CONF_CONNECTION] = {
@@ -80,11 +173,32 @@ class TrainTravelerConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                     CONF_REGION: user_input[CONF_REGION]
                 }
                 self.data[CONF_AREAS] = {}
-                return await self.async_step_start_end()
+                return await self.async_step_route_type()
         
         return self.async_show_form(
             step_id="user", data_schema=CONNECTION_SCHEMA, errors=errors
         )
+
+    async def async_step_route_type(self, user_input=None):
+        """Follow a single route, or many routes added from the options of the entry."""
+        return self.async_show_menu(step_id="route_type", menu_options=["start_end", "routes"])
+
+    async def async_step_routes(self, user_input=None):
+        """Handle the settings of an entry holding many routes, added from its options."""
+        errors = {}
+
+        if user_input is not None:
+            self.data.update(journey_settings(user_input))
+            self.data[CONF_MULTI_ROUTE] = True
+            del self.data[CONF_AREAS]
+
+            return self.async_create_entry(title=user_input[CONF_NAME], data=self.data, options={CONF_ROUTES: []})
+
+        return self.async_show_form(
+            step_id="routes",
+            data_schema=ROUTES_SCHEMA,
+            errors=errors,
+        )
     
     async def async_step_start_end(self, user_input=None):
         """Handle the start/end points step."""
@@ -92,18 +206,21 @@ class TrainTravelerConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
         if user_input is not None:
             try:
-                connection = ApiConnectionManager(self.data[CONF_CONNECTION][CONF_URL], self.data[CONF_CONNECTION][CONF_API_KEY], self.data[CONF_CONNECTION][CONF_REGION])
-                start = await fetch_area(user_input[CONF_FROM], connection, self.hass)
-                end = await fetch_area(user_input[CONF_TO], connection, self.hass)
+                start, end = await asyncio.gather(
+                    fetch_area(user_input[CONF_FROM], self._client, self.hass),
+                    fetch_area(user_input[CONF_TO], self._client, self.hass)
+                )
             except ValueError:
                 errors["base"] = "fetch_area_error"
+            except CannotConnect:
+                errors["base"] = "cannot_connect"
 
             if not errors:
                 self.data[CONF_AREAS] = {
                     "from_area": start,
                     "to_area": end
                 }
-            return await self.async_step_validate_start_end()
+                return await self.async_step_validate_start_end()
 
 
         return self.async_show_form(
@@ -117,46 +234,13 @@ class TrainTravelerConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         errors = {}
 
         if user_input is not None:
-            start = next((area for area in self.data[CONF_AREAS]["from_area"] if area.name == user_input[CONF_START_AREA]), None)
-            end = next((area for area in self.data[CONF_AREAS]["to_area"] if area.name == user_input[CONF_END_AREA]), None)
-            self.data[CONF_START_AREA] = {
-                CONF_AREA_ID: start.stop_area.id,
-                CONF_AREA_NAME: start.stop_area.name,
-                CONF_AREA_LABEL: start.stop_area.label,
-                CONF_AREA_COORD: {
-                    "lon": start.stop_area.coord["lon"],
-                    "lat": start.stop_area.coord["lat"]
-                }
-            }
-            
-            self.data[CONF_END_AREA] = {
-                CONF_AREA_ID: end.stop_area.id,
-                CONF_AREA_NAME: end.stop_area.name,
-                CONF_AREA_LABEL: end.stop_area.label,
-                CONF_AREA_COORD: {
-                    "lon": end.stop_area.coord["lon"],
-                    "lat": end.stop_area.coord["lat"]
-                }
-            }
+            self.data[CONF_START_AREA], self.data[CONF_END_AREA] = selected_areas(self.data[CONF_AREAS], user_input)
             del self.data[CONF_AREAS]
             return await self.async_step_journey()
-        
-        data_schema = vol.Schema(
-            {
-                vol.Required(CONF_START_AREA, default=self.data[CONF_AREAS]["from_area"][0].name): selector.SelectSelector(
-                     selector.SelectSelectorConfig(
-                         options=[area.name for area in self.data[CONF_AREAS]["from_area"]], mode=selector.SelectSelectorMode.DROPDOWN
-                         )),
-                vol.Required(CONF_END_AREA, default=self.data[CONF_AREAS]["to_area"][0].name): selector.SelectSelector(
-                     selector.SelectSelectorConfig(
-                         options=[area.name for area in self.data[CONF_AREAS]["to_area"]], mode=selector.SelectSelectorMode.DROPDOWN
-                         ))
-            }
-        )
 
         return self.async_show_form(
             step_id="validate_start_end",
-            data_schema=data_schema,
+            data_schema=areas_schema(self.data[CONF_AREAS]),
             errors=errors
         )
     
@@ -167,10 +251,7 @@ class TrainTravelerConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
         if user_input is not None:
             # Finalize the configuration and create the entry
-            self.data[CONF_JOURNEYS_COUNT] = user_input[CONF_JOURNEYS_COUNT]
-            self.data[CONF_SCAN_INTERVAL] = user_input[CONF_SCAN_INTERVAL]
-            self.data[CONF_LAST_JOURNEY] = user_input[CONF_LAST_JOURNEY] if CONF_LAST_JOURNEY in user_input else False
-            self.data[CONF_PAUSE_UPDATE_EXPERIMENTAL] = user_input[CONF_PAUSE_UPDATE_EXPERIMENTAL] if CONF_PAUSE_UPDATE_EXPERIMENTAL in user_input else False
+            self.data.update(journey_settings(user_input))
 
             return self.async_create_entry(title=f"{self.data[CONF_START_AREA][CONF_AREA_LABEL]} - {self.data[CONF_END_AREA][CONF_AREA_LABEL]}" , data=self.data)
 
@@ -180,3 +261,133 @@ class TrainTravelerConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             data_schema=JOURNEY_SCHEMA,
             errors=errors,
         )
+
+    @staticmethod
+    @core.callback
+    def async_get_options_flow(config_entry: config_entries.ConfigEntry) -> config_entries.OptionsFlow:
+        return TrainTravelerOptionsFlow(config_entry)
+
+
+def settings_schema(settings: dict) -> vol.Schema:
+    """Return the schema of the settings applied without reloading the entry, with the current ones as defaults."""
+    return vol.Schema({
+        vol.Required(CONF_JOURNEYS_COUNT, default=settings[CONF_JOURNEYS_COUNT]): cv.positive_int,
+        vol.Required(CONF_SCAN_INTERVAL, default=settings[CONF_SCAN_INTERVAL]): vol.All(vol.Coerce(int), vol.Range(min=MIN_REFRESH_RATE)),
+        vol.Optional(CONF_PREFETCH_JOURNEYS, default=settings.get(CONF_PREFETCH_JOURNEYS, DEFAULT_PREFETCH_JOURNEYS)): cv.positive_int,
+        vol.Optional(CONF_LAST_JOURNEY, default=settings.get(CONF_LAST_JOURNEY, False)): cv.boolean,
+        vol.Optional(CONF_BIDIRECTIONAL, default=settings.get(CONF_BIDIRECTIONAL, False)): cv.boolean,
+        vol.Optional(CONF_PAUSE_UPDATE_EXPERIMENTAL, default=settings.get(CONF_PAUSE_UPDATE_EXPERIMENTAL, False)): cv.boolean,
+        vol.Optional(CONF_ADAPTIVE_POLLING, default=settings.get(CONF_ADAPTIVE_POLLING, False)): cv.boolean,
+        vol.Optional(CONF_DISRUPTION_WEBHOOK, default=settings.get(CONF_DISRUPTION_WEBHOOK, False)): cv.boolean
+    })
+
+
+class TrainTravelerOptionsFlow(config_entries.OptionsFlow):
+    """Change the settings of an entry, and the routes of a multi-route entry.
+
+    Options are applied to the running coordinators, see async_update_options.
+    """
+
+    def __init__(self, config_entry: config_entries.ConfigEntry):
+        self.config_entry = config_entry
+        self.areas = {}
+        # The webhook keeps its id once enabled, so its URL does not change when it is disabled and enabled again
+        self.webhook_id = config_entry.options.get(CONF_WEBHOOK_ID) or webhook.async_generate_id()
+
+    @property
+    def routes(self) -> list[dict]:
+        return self.config_entry.options.get(CONF_ROUTES, [])
+
+    async def async_step_init(self, user_input=None):
+        """Pick the change to make."""
+        if not is_multi_route(self.config_entry):
+            return await self.async_step_settings()
+        return self.async_show_menu(step_id="init", menu_options=["settings", "add_route", "remove_route"])
+
+    async def async_step_settings(self, user_input=None):
+        """Change the journeys followed and how often they are refreshed."""
+        if user_input is not None:
+            options = {**self.config_entry.options, **user_input}
+            if user_input.get(CONF_DISRUPTION_WEBHOOK, False):
+                options[CONF_WEBHOOK_ID] = self.webhook_id
+            return self.async_create_entry(title="", data=options)
+
+        return self.async_show_form(
+            step_id="settings",
+            data_schema=settings_schema(entry_settings(self.config_entry)),
+            description_placeholders={"webhook_path": webhook.async_generate_path(self.webhook_id)}
+        )
+
+    async def async_step_add_route(self, user_input=None):
+        """Search the stations of a new route."""
+        errors = {}
+
+        if user_input is not None:
+            # Searches go through the client of the entry, and the cache shared with the config flows
+            client = async_get_flow_client(self.hass, self.config_entry.data)
+            try:
+                start, end = await asyncio.gather(
+                    fetch_area(user_input[CONF_FROM], client, self.hass),
+                    fetch_area(user_input[CONF_TO], client, self.hass)
+                )
+            except ValueError:
+                errors["base"] = "fetch_area_error"
+            except CannotConnect:
+                errors["base"] = "cannot_connect"
+
+            if not errors:
+                self.areas = {
+                    "from_area": start,
+                    "to_area": end
+                }
+                return await self.async_step_validate_route()
+
+        return self.async_show_form(
+            step_id="add_route",
+            data_schema=AREA_SCHEMA,
+            errors=errors
+        )
+
+    async def async_step_validate_route(self, user_input=None):
+        """Pick the stations of the new route among the ones found."""
+        errors = {}
+
+        if user_input is not None:
+            start, end = selected_areas(self.areas, user_input)
+            if any(route[CONF_START_AREA][CONF_AREA_ID] == start[CONF_AREA_ID] and route[CONF_END_AREA][CONF_AREA_ID] == end[CONF_AREA_ID] for route in self.routes):
+                errors["base"] = "route_exists"
+            else:
+                route = {
+                    CONF_ROUTE_ID: ulid_now(),
+                    CONF_START_AREA: start,
+                    CONF_END_AREA: end
+                }
+                return self.async_create_entry(title="", data={**self.config_entry.options, CONF_ROUTES: [*self.routes, route]})
+
+        return self.async_show_form(
+            step_id="validate_route",
+            data_schema=areas_schema(self.areas),
+            errors=errors
+        )
+
+    async def async_step_remove_route(self, user_input=None):
+        """Pick the routes to remove."""
+        if not self.routes:
+            return self.async_abort(reason="no_routes")
+
+        if user_input is not None:
+            removed = set(user_input[CONF_ROUTES])
+            return self.async_create_entry(title="", data={
+                **self.config_entry.options,
+                CONF_ROUTES: [route for route in self.routes if route[CONF_ROUTE_ID] not in removed]
+            })
+
+        return self.async_show_form(
+            step_id="remove_route",
+            data_schema=vol.Schema({
+                vol.Required(CONF_ROUTES, default=[]): cv.multi_select({
+                    route[CONF_ROUTE_ID]: f"{route[CONF_START_AREA][CONF_AREA_LABEL]} - {route[CONF_END_AREA][CONF_AREA_LABEL]}"
+                    for route in self.routes
+                })
+            })
+        )
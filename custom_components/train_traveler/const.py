@@ -1,3 +1,5 @@
+from datetime import time, timedelta
+
 from homeassistant.const import Platform
 
 VERSION = "0.1.0-alpha.2"
@@ -10,7 +12,77 @@ DEFAULT_CONNECTION_URL = "https://api.sncf.com/v1"
 DEFAULT_CONNECTION_REGION = "sncf"
 
 DEFAULT_REFRESH_RATE = 720
+# Lowest refresh rate accepted, in seconds
+MIN_REFRESH_RATE = 30
 DEFAULT_JOURNEY_COUNT = 1
+DEFAULT_STATIC_CACHE_TTL = 86400
+DEFAULT_MAX_CONCURRENT_REFRESH = 4
+DEFAULT_CACHE_MAX_AGE = 21600
+# Requests allowed per day by the free plan of the SNCF API
+DEFAULT_DAILY_QUOTA = 5000
+DEFAULT_PREFETCH_JOURNEYS = 0
+DEFAULT_MAX_TRANSFERS = 0
+
+STORAGE_SAVE_DELAY = 10
+# Seconds allowed to find the timezone of a stop area, Home Assistant's one is used meanwhile
+TIMEZONE_LOOKUP_TIMEOUT = 10
+# Seconds allowed to the requests of the config flows, the form is shown again with an error afterwards
+FLOW_REQUEST_TIMEOUT = 30
+TIMETABLE_PAGE_SIZE = 50
+DISRUPTIONS_PAGE_SIZE = 100
+
+# Token bucket of the requests of an API key: requests per second and burst size
+RATE_LIMIT_RATE = 5
+RATE_LIMIT_BURST = 10
+
+# Polling intervals are stretched when the share of the daily quota left divided by the share of the day left goes below these
+QUOTA_LOW_PRIORITY_HEADROOM = 1.0
+QUOTA_HIGH_PRIORITY_HEADROOM = 0.5
+QUOTA_MAX_STRETCH = 16
+
+# Retries of a failing route and circuit breaker of a connection
+BACKOFF_MIN_DELAY = timedelta(seconds=30)
+BACKOFF_MAX_DELAY = timedelta(minutes=30)
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_MIN_OPEN_DURATION = timedelta(minutes=2)
+BREAKER_MAX_OPEN_DURATION = timedelta(minutes=30)
+
+# Upper bounds, in seconds, of the latency histogram of the API requests
+METRICS_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Stop areas found by the searches of the config flows
+PLACES_CACHE_SIZE = 64
+PLACES_CACHE_TTL = 86400
+
+DISRUPTION_FEED_INTERVAL = timedelta(seconds=120)
+DISRUPTION_FEED_MAX_AGE = timedelta(hours=1)
+# Effect of the fetched disruptions announcing delays, the times of the others (a cancelled train for instance) are no delay
+DELAY_DISRUPTION_EFFECT = "SIGNIFICANT_DELAYS"
+# Effect of the disruptions pushed to a webhook without one, as named by the SNCF API
+PUSHED_DISRUPTION_DEFAULT_EFFECT = "UNKNOWN_EFFECT"
+
+SCHEDULER_BATCH_WINDOW = timedelta(seconds=60)
+
+# Bidirectional routes: the outbound direction is refreshed at the regular rate before this time and the return one after,
+# each direction being refreshed this many times less often, at most, during the other half of the day
+BIDIRECTIONAL_SWITCH_TIME = time(12, 0)
+BIDIRECTIONAL_OFF_PEAK_STRETCH = 6
+
+ADAPTIVE_MIN_INTERVAL = timedelta(seconds=60)
+ADAPTIVE_APPROACH_INTERVAL = timedelta(seconds=300)
+ADAPTIVE_DISRUPTED_INTERVAL = timedelta(seconds=180)
+ADAPTIVE_IDLE_INTERVAL = timedelta(hours=1)
+ADAPTIVE_LEAD_TIME = timedelta(minutes=10)
+ADAPTIVE_BACKOFF_THRESHOLD = timedelta(hours=1)
+
+DATA_CLIENTS = "clients"
+DATA_SCHEDULERS = "schedulers"
+DATA_DISRUPTION_FEEDS = "disruption_feeds"
+DATA_METRICS = "metrics"
+DATA_PLACES = "places"
+DATA_ROUTES = "routes"
+DATA_ROUTE_RETRIES = "route_retries"
+DATA_WEBHOOK = "webhook"
 
 CONF_CONNECTION = "connection"
 CONF_AREAS = "start_end"
@@ -22,14 +94,34 @@ CONF_START_AREA = "start_area"
 CONF_END_AREA = "end_area"
 CONF_NEXT_JOURNEY = "next_journey"
 CONF_LAST_JOURNEY = "last_journey"
+# Coordinators of the return direction of a bidirectional route
+CONF_RETURN_NEXT_JOURNEY = "return_next_journey"
+CONF_RETURN_LAST_JOURNEY = "return_last_journey"
+COORDINATOR_TYPES = (CONF_NEXT_JOURNEY, CONF_LAST_JOURNEY, CONF_RETURN_NEXT_JOURNEY, CONF_RETURN_LAST_JOURNEY)
 CONF_PAUSE_UPDATE_EXPERIMENTAL = "pause_update_experimental"
+CONF_BATCH_REFRESH = "batch_refresh"
+CONF_MAX_CONCURRENT_REFRESH = "max_concurrent_refresh"
+CONF_ADAPTIVE_POLLING = "adaptive_polling"
+CONF_CACHE_MAX_AGE = "cache_max_age"
+CONF_DAILY_QUOTA = "daily_quota"
+CONF_PREFETCH_JOURNEYS = "prefetch_journeys"
+CONF_MAX_TRANSFERS = "max_transfers"
+CONF_BIDIRECTIONAL = "bidirectional"
+CONF_DISRUPTION_WEBHOOK = "disruption_webhook"
+# Entries holding a list of routes, stored in the options of the entry
+CONF_MULTI_ROUTE = "multi_route"
+CONF_ROUTES = "routes"
+CONF_ROUTE_ID = "route_id"
 
 CONF_AREA_ID = "area_id"
 CONF_AREA_NAME = "area_name"
 CONF_AREA_LABEL = "area_label"
 CONF_AREA_COORD = "area_coord"
+CONF_AREA_TIMEZONE = "area_timezone"
 
 ATTR_JOURNEYS_LIST = "journeys"
+ATTR_STALE = "stale"
+ATTR_FETCHED_AT = "fetched_at"
 ATTR_LINE_JOURNEY = "line"
 ATTR_DIRECTION_JOURNEY = "direction"
 ATTR_DEPARTURE_TIME_JOURNEY = "departure_time"
@@ -39,6 +131,10 @@ ATTR_PHYSICAL_MODE_JOURNEY = "physical_mode"
 ATTR_DEPARTURE_JOURNEY = "departure"
 ATTR_ARRIVAL_JOURNEY = "arrival"
 ATTR_DELAY_JOURNEY = "delay"
+ATTR_ARRIVAL_DELAY_JOURNEY = "arrival_delay"
+ATTR_TRANSFERS_JOURNEY = "transfers"
+ATTR_TRANSFER_SLACK_JOURNEY = "transfer_slack"
+ATTR_LEGS_LIST = "legs"
 
 ATTR_DISRUPTIONS_LIST = "disruptions"
 ATTR_DISRUPTION_TYPE = "disruption_type"
@@ -1,18 +1,21 @@
 from __future__ import annotations
 
-from datetime import timedelta, datetime
+import asyncio
+from datetime import timedelta, datetime, time, tzinfo
 import logging
-import pytz
+from time import monotonic
 
 import async_timeout
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.helpers.update_coordinator import (
     DataUpdateCoordinator,
     UpdateFailed
 )
 from homeassistant.const import CONF_SCAN_INTERVAL
+from homeassistant.helpers.event import async_track_time_change
+from homeassistant.util import dt as dt_util
 
 from .const import (
     CONF_START_AREA, 
@@ -22,49 +25,97 @@ from .const import (
     CONF_AREA_COORD, 
     CONF_AREA_ID, 
     CONF_AREA_NAME,
-    CONF_PAUSE_UPDATE_EXPERIMENTAL
+    CONF_AREA_TIMEZONE,
+    CONF_PAUSE_UPDATE_EXPERIMENTAL,
+    CONF_ADAPTIVE_POLLING,
+    CONF_CACHE_MAX_AGE,
+    CONF_PREFETCH_JOURNEYS,
+    CONF_MAX_TRANSFERS,
+    CONF_BIDIRECTIONAL,
+    DEFAULT_CACHE_MAX_AGE,
+    MIN_REFRESH_RATE,
+    DEFAULT_PREFETCH_JOURNEYS,
+    DEFAULT_MAX_TRANSFERS,
+    BACKOFF_MAX_DELAY,
+    BIDIRECTIONAL_SWITCH_TIME,
+    BIDIRECTIONAL_OFF_PEAK_STRETCH,
+    STORAGE_SAVE_DELAY,
+    TIMEZONE_LOOKUP_TIMEOUT
 )
+from .store import STORAGE_VERSION, JourneysStore, storage_key, dump_journeys, load_journeys
+from .snapshot import RouteSnapshot, route_snapshot, route_with_pushed_disruptions
+from .polling import adaptive_refresh_interval
+from .timetable import DailyTimetable
+from .attributes import JourneysAttributes
+from .metrics import RouteMetrics, current_route_metrics
+from .resilience import backoff_delay
+from .scheduler import RouteScheduler
+from .routes import route_config, route_key, async_update_route
 
-from sncf.repositories.repository_manager import ApiRepository
-from sncf.repositories.journey_repository import ApiJourneyRepository 
-from sncf.repositories.stop_area_repository import ApiStopAreaRepository
-from sncf.repositories.disruption_repository import ApiDisruptionRepository
-
-
-from sncf.connections.connection_manager import ApiConnectionManager
-from sncf.services.journey_service import JourneyService
+from .api import SncfApiClient
+from .repositories import (
+    SharedJourneyRepository,
+    SharedStopAreaRepository,
+    SharedDisruptionRepository
+)
+from .services import AsyncJourneyService
+from .disruptions import async_get_disruption_feed
 
 from sncf.models.area_model import Area
 
 
 _LOGGER = logging.getLogger(__name__)
 
+
 class JourneyCoordinator(DataUpdateCoordinator):
 
-    def __init__(self, connection: ApiConnectionManager, hass: HomeAssistant, entry: ConfigEntry, last_journey: bool = False):
-        self.config = entry.data
+    def __init__(self, client: SncfApiClient, hass: HomeAssistant, entry: ConfigEntry, last_journey: bool = False, metrics: RouteMetrics | None = None, route_id: str | None = None, reverse: bool = False):
+        # Routes of a multi-route entry have an id, the single route of a regular entry has none
+        self.route_id = route_id
+        # Return direction of a bidirectional route, from its end area to its start area
+        self.reverse = reverse
+        self._start_key = CONF_END_AREA if reverse else CONF_START_AREA
+        self.route_key = route_key(entry.entry_id, route_id)
+        self.config = route_config(entry, route_id)
         
         # set update_interval to 6hours if we are going to fetch last journey (to reduce useless api call)
         update_interval = 21600
         if not last_journey:
-            update_interval = self.config[CONF_SCAN_INTERVAL]
+            # Entries saved before the minimum was enforced may have a lower one
+            update_interval = max(self.config[CONF_SCAN_INTERVAL], MIN_REFRESH_RATE)
+
+        # Kept apart from update_interval which is unset when a RouteScheduler handles the refresh
+        self.scan_interval = timedelta(seconds=update_interval)
+        self.refresh_interval = self.scan_interval
+        # Interval before the quota of the API key stretches it
+        self._base_interval = self.scan_interval
 
         super().__init__(
             hass,
             _LOGGER,
             name="Journey",
-            update_interval=timedelta(seconds=update_interval)
+            update_interval=self.refresh_interval
         )
         
         self.last_journey = last_journey
-        self.connection = connection
+        # Entities are created for at most this number of journeys
+        self.journeys_count = 1 if last_journey else self.config[CONF_JOURNEYS_COUNT]
+        # Extra journeys fetched ahead, served as trains leave
+        self._prefetch = 0 if last_journey else self.config.get(CONF_PREFETCH_JOURNEYS, DEFAULT_PREFETCH_JOURNEYS)
+        self._buffer: RouteSnapshot | None = None
+        # Journeys with connections are fetched in a single request, like direct ones
+        self.max_transfers = self.config.get(CONF_MAX_TRANSFERS, DEFAULT_MAX_TRANSFERS)
+        self.client = client
+        self.connection = client.connection
+        self.metrics = metrics if metrics is not None else RouteMetrics()
         self.hass = hass
         self.entry = entry
-        self.repository_manager = ApiRepository(self.connection)
-        self.journey_service: JourneyService.JourneyService = JourneyService(
-            stop_area_repository=ApiStopAreaRepository(self.connection),
-            journey_repository=ApiJourneyRepository(self.connection),
-            disruption_repository=ApiDisruptionRepository(self.connection)
+        self.disruption_feed = async_get_disruption_feed(hass, self.client)
+        self.journey_service: AsyncJourneyService = AsyncJourneyService(
+            stop_area_repository=SharedStopAreaRepository(self.client),
+            journey_repository=SharedJourneyRepository(self.client),
+            disruption_repository=SharedDisruptionRepository(self.client),
+            disruption_feed=self.disruption_feed
         )
         self.start_area = Area(
             self.config[CONF_START_AREA][CONF_AREA_ID], 
@@ -79,8 +130,15 @@ class JourneyCoordinator(DataUpdateCoordinator):
             self.config[CONF_END_AREA][CONF_AREA_LABEL], 
             self.config[CONF_END_AREA][CONF_AREA_COORD]
         )
+        if reverse:
+            self.start_area, self.end_area = self.end_area, self.start_area
+        self.bidirectional = self.config.get(CONF_BIDIRECTIONAL, False)
 
-        self._timezone = pytz.timezone("Europe/Paris")
+        # Journey times are local to the start stop area, resolved on setup when not known yet
+        self.timezone: tzinfo = (
+            dt_util.get_time_zone(self.config[self._start_key].get(CONF_AREA_TIMEZONE, hass.config.time_zone))
+            or dt_util.DEFAULT_TIME_ZONE
+        )
         self._pause_update = False
         self._pause_interval = None
         self._next_journeys = None
@@ -91,20 +149,352 @@ class JourneyCoordinator(DataUpdateCoordinator):
         else:
             self._conf_pause_update_experimental = self.config[CONF_PAUSE_UPDATE_EXPERIMENTAL]
 
+        self._conf_adaptive_polling = not last_journey and self.config.get(CONF_ADAPTIVE_POLLING, False)
+
+        self.cache_max_age = timedelta(seconds=self.config.get(CONF_CACHE_MAX_AGE, DEFAULT_CACHE_MAX_AGE))
+        self.fetched_at: datetime | None = None
+        # The last journeys are served, flagged as stale, while the API fails
+        self.stale = False
+        self._failures = 0
+        self._store = JourneysStore(hass, STORAGE_VERSION, storage_key(self.route_key, last_journey, reverse))
+        # Set while a RouteScheduler refreshes this coordinator with the other routes of its connection
+        self.scheduler: RouteScheduler | None = None
+
+        # Indexes of the journeys which changed during the last refresh, entities of the others skip their state write
+        self.changed_journeys: set[int] = set()
+        self.attributes = JourneysAttributes()
+
+    @property
+    def label(self) -> str:
+        """Start and end areas of the journeys, in the direction of this coordinator."""
+        return f"{self.start_area.label} - {self.end_area.label}"
+
+    def _diff_journeys(self, journeys: RouteSnapshot) -> None:
+        # Snapshots are equal when their entities show the same thing
+        served = self.data.journeys if self.data is not None else ()
+        self.changed_journeys = {
+            index for index in range(max(len(journeys.journeys), len(served)))
+            if index >= len(journeys.journeys) or index >= len(served) or journeys.journeys[index] != served[index]
+        }
+        self.attributes.update(journeys, self.changed_journeys)
+
+    async def async_restore(self) -> bool:
+        """Restore the journeys saved by a previous run, return False when there is none usable."""
+        stored = await self._store.async_load()
+        if stored is None:
+            return False
+
+        fetched_at = dt_util.parse_datetime(stored["fetched_at"])
+        if fetched_at is None or dt_util.utcnow() - fetched_at > self.cache_max_age:
+            _LOGGER.debug("Cached journeys for %s are stale", self.label)
+            return False
+
+        try:
+            journeys = load_journeys(stored["journeys"])
+        except (KeyError, TypeError, ValueError) as err:
+            _LOGGER.warning("Ignoring invalid cached journeys: %s", err)
+            return False
+
+        _LOGGER.info("Restored journeys for %s fetched at %s", self.label, fetched_at)
+        self.fetched_at = fetched_at
+        self._buffer = journeys
+        if self._conf_adaptive_polling:
+            self._adapt_refresh_interval(journeys)
+        journeys = self._serve(journeys)
+        self._diff_journeys(journeys)
+        self.async_set_updated_data(journeys)
+        return True
+
+    @callback
+    def _async_load_timezone(self) -> bool:
+        """Use the timezone saved with the start area, return False when it is not known yet."""
+        # The other coordinator of the route may have resolved it already
+        config = route_config(self.entry, self.route_id)
+        if CONF_AREA_TIMEZONE not in config[self._start_key]:
+            return False
+
+        self.config = config
+        self.timezone = dt_util.get_time_zone(self.config[self._start_key][CONF_AREA_TIMEZONE]) or self.timezone
+        return True
+
+    async def _async_resolve_timezone(self) -> None:
+        if self._async_load_timezone():
+            return
+
+        try:
+            async with asyncio.timeout(TIMEZONE_LOOKUP_TIMEOUT):
+                timezone = await self.journey_service.stop_area_repository.async_find_stop_area_timezone(self.start_area.id)
+        except TimeoutError:
+            _LOGGER.warning("Timezone of %s not found in time, using Home Assistant's one", self.start_area.label)
+            return
+        except Exception as err:
+            _LOGGER.warning("Timezone of %s unknown, using Home Assistant's one: %s", self.start_area.label, err)
+            return
+
+        if timezone is None or dt_util.get_time_zone(timezone) is None:
+            return
+
+        self.timezone = dt_util.get_time_zone(timezone)
+        # Saved with the area so it is only fetched once
+        config = route_config(self.entry, self.route_id)
+        async_update_route(self.hass, self.entry, self.route_id, {
+            self._start_key: {**config[self._start_key], CONF_AREA_TIMEZONE: timezone}
+        })
+        self.config = route_config(self.entry, self.route_id)
+
+    async def _async_refresh_restored(self, resolve_timezone: bool, refresh: bool) -> None:
+        if resolve_timezone:
+            await self._async_resolve_timezone()
+        if refresh:
+            await self.async_refresh()
+
+    async def async_setup(self, tick: bool = True) -> None:
+        """Provide the first data, from the cache when possible so setup does not wait for the API.
+
+        Without tick, the caller runs _async_tick every minute, once for many routes.
+        """
+        timezone_known = self._async_load_timezone()
+        if not await self.async_restore():
+            if not timezone_known:
+                await self._async_resolve_timezone()
+            await self.async_config_entry_first_refresh()
+        else:
+            self._advance_journeys(dt_util.utcnow())
+            # Restored journeys are shown with Home Assistant's timezone until the one of the area is found
+            refresh = dt_util.utcnow() - self.fetched_at >= self.refresh_interval
+            if not timezone_known or refresh:
+                self.entry.async_create_background_task(
+                    self.hass,
+                    self._async_refresh_restored(not timezone_known, refresh),
+                    f"{self.label} journeys refresh"
+                )
+
+        if tick:
+            self.entry.async_on_unload(async_track_time_change(self.hass, self._async_tick, second=0))
+        self.entry.async_on_unload(self.disruption_feed.async_add_listener(self._async_handle_pushed_disruptions))
+
+    def _serve(self, journeys: RouteSnapshot) -> RouteSnapshot:
+        """Return the journeys shown by the entities from the fetched ones, with the disruptions pushed since."""
+        return route_with_pushed_disruptions(journeys.sliced(self.journeys_count), self.disruption_feed.pushed_disruptions())
+
+    @callback
+    def _async_handle_pushed_disruptions(self) -> None:
+        """Show pushed disruptions right away, with no API call.
+
+        Only the entities of the journeys they change write their state.
+        """
+        if self._buffer is None or self.data is None:
+            return
+
+        data = self._serve(self._buffer)
+        self._diff_journeys(data)
+        if not self.changed_journeys:
+            return
+
+        _LOGGER.debug("Pushed disruptions changed journeys %s of %s", sorted(self.changed_journeys), self.label)
+        if self.stale:
+            self.attributes.set_stale(self.fetched_at)
+        self.data = data
+        self.async_update_listeners()
+
+    def _advance_journeys(self, now: datetime) -> bool:
+        """Drop the next journeys which already left, return True when some were dropped."""
+        if self.last_journey or self._buffer is None:
+            # The last journey of the day is still shown once it left
+            return False
+
+        journeys = tuple(data for data in self._buffer.journeys if data.departure > now)
+        if len(journeys) == len(self._buffer.journeys):
+            return False
+
+        _LOGGER.debug("%s journeys of %s left since the last refresh", len(self._buffer.journeys) - len(journeys), self.label)
+        self._buffer = RouteSnapshot(self._buffer.start, self._buffer.end, journeys)
+        data = self._serve(self._buffer)
+        self._diff_journeys(data)
+        if self.stale:
+            self.attributes.set_stale(self.fetched_at)
+        self.data = data
+
+        # Entities of the journeys missing are unavailable until the next refresh, which is requested right away
+        if len(journeys) < self.journeys_count:
+            _LOGGER.debug("Fetched journeys of %s ran out, refreshing", self.label)
+            if self.scheduler is not None:
+                # Keeps the batch of the scheduler and its next refresh of this route in step
+                self.scheduler.async_request_refresh(self)
+            else:
+                self.entry.async_create_background_task(
+                    self.hass,
+                    self.async_request_refresh(),
+                    f"{self.label} journeys refresh"
+                )
+        return True
+
+    @callback
+    def _async_tick(self, now: datetime) -> None:
+        """Update entities every minute from the journeys already fetched, with no API call."""
+        if not self._advance_journeys(now):
+            self.changed_journeys = set()
+        self.async_update_listeners()
+
+    @callback
+    def async_update_config(self) -> bool:
+        """Apply the settings changed from the options flow to the running coordinator.
+
+        The refresh interval and the pause apply from now on, and the number
+        of journeys served changes from the journeys already fetched. Return
+        True when more journeys are needed than the fetched ones, a refresh
+        being then up to the caller.
+        """
+        self.config = route_config(self.entry, self.route_id)
+        if self.last_journey:
+            return False
+
+        scan_interval = timedelta(seconds=max(self.config[CONF_SCAN_INTERVAL], MIN_REFRESH_RATE))
+        journeys_count = self.config[CONF_JOURNEYS_COUNT]
+        prefetch = self.config.get(CONF_PREFETCH_JOURNEYS, DEFAULT_PREFETCH_JOURNEYS)
+        pause_update = self.config.get(CONF_PAUSE_UPDATE_EXPERIMENTAL, False)
+        adaptive_polling = self.config.get(CONF_ADAPTIVE_POLLING, False)
+        if (scan_interval, journeys_count, prefetch, pause_update, adaptive_polling) == (
+            self.scan_interval, self.journeys_count, self._prefetch, self._conf_pause_update_experimental, self._conf_adaptive_polling
+        ):
+            return False
+
+        _LOGGER.debug("Settings of journey %s changed", self.label)
+        fetch = journeys_count + prefetch > self.journeys_count + self._prefetch and (
+            self._buffer is None or len(self._buffer.journeys) < journeys_count
+        )
+        self.scan_interval = scan_interval
+        self.journeys_count = journeys_count
+        self._prefetch = prefetch
+        self._conf_pause_update_experimental = pause_update
+        if not pause_update:
+            self._pause_update = False
+            self._pause_interval = None
+        self._conf_adaptive_polling = adaptive_polling
+
+        if adaptive_polling and self._buffer is not None:
+            self._adapt_refresh_interval(self._buffer)
+        else:
+            self._set_refresh_interval(scan_interval)
+        # The next refresh was planned with the previous interval
+        if self.update_interval is not None:
+            self._schedule_refresh()
+
+        if self._buffer is not None and self.data is not None:
+            data = self._serve(self._buffer)
+            self._diff_journeys(data)
+            if self.stale:
+                self.attributes.set_stale(self.fetched_at)
+            self.data = data
+            self.async_update_listeners()
+        return fetch
+
+    async def _async_get_timetable(self) -> DailyTimetable:
+        """Return today's timetable of the route, fetched once a day and shared through the client."""
+        now = dt_util.now(self.timezone)
+        day = now.date()
+        end_of_day = datetime.combine(day + timedelta(days=1), time.min, tzinfo=self.timezone)
+
+        return await self.client.async_cached(
+            # Snapshots of the timetable are local to the timezone they were built with
+            ("timetable", self.start_area.id, self.end_area.id, self.max_transfers, day, str(self.timezone)),
+            lambda: self.journey_service.async_get_daily_timetable(self.start_area, self.end_area, day, self.timezone, self.max_transfers),
+            ttl=max((end_of_day - now).total_seconds(), 60)
+        )
+
+    def _async_save(self, journeys: RouteSnapshot) -> None:
+        self.fetched_at = dt_util.utcnow()
+        self._store.async_delay_save(
+            lambda: {"fetched_at": self.fetched_at.isoformat(), "journeys": dump_journeys(journeys)},
+            STORAGE_SAVE_DELAY
+        )
+
+    async def async_flush(self) -> None:
+        """Save the journeys fetched last now, so a reload of the entry restores them."""
+        await self._store.async_flush()
+
+    def _set_refresh_interval(self, interval: timedelta) -> None:
+        self._base_interval = interval
+        self._apply_refresh_interval()
+
+    def _apply_refresh_interval(self) -> None:
+        interval = self._base_interval
+        if self._failures:
+            # Retry sooner than the regular interval, but not before the API gets probed again
+            interval = max(
+                backoff_delay(self._failures, min(self._base_interval, BACKOFF_MAX_DELAY)),
+                self.client.breaker.time_until_probe()
+            )
+
+        # The last journey has a low priority, it backs off first when the quota runs low
+        stretch = self.client.limiter.stretch_factor(low_priority=self.last_journey)
+        interval = interval * stretch
+        if stretch > 1:
+            _LOGGER.debug("Quota of the API key running low, refresh of journey %s stretched to %s", self.label, interval)
+
+        if self.bidirectional and not self.last_journey and not self._failures:
+            interval = self._off_peak_interval(interval)
+
+        self.refresh_interval = interval
+        # update_interval is None when the refresh is handled by a RouteScheduler
+        if self.update_interval is not None:
+            self.update_interval = interval
+
+    def _off_peak_interval(self, interval: timedelta) -> timedelta:
+        """Stretch the refresh interval of a direction of a bidirectional route outside of its half of the day.
+
+        The outbound direction is followed in the morning and the return one
+        in the afternoon. The stretched interval ends when the half of the
+        day of the direction starts again.
+        """
+        now = dt_util.now(self.timezone)
+        switch = datetime.combine(now.date(), BIDIRECTIONAL_SWITCH_TIME, tzinfo=self.timezone)
+        morning = now < switch
+        if morning != self.reverse:
+            return interval
+
+        active = switch if morning else datetime.combine(now.date() + timedelta(days=1), time.min, tzinfo=self.timezone)
+        return max(min(interval * BIDIRECTIONAL_OFF_PEAK_STRETCH, active - now), interval)
+
+    def _adapt_refresh_interval(self, journeys: RouteSnapshot) -> None:
+        departures = [data.departure for data in journeys.journeys]
+        disrupted = any(data.disrupted for data in journeys.journeys)
+
+        interval = adaptive_refresh_interval(departures, disrupted, dt_util.utcnow(), self.scan_interval)
+        _LOGGER.debug("Next refresh of journey %s in %s", self.label, interval)
+        self._set_refresh_interval(interval)
+
     async def _async_update_data(self):
-        _LOGGER.info("Fetch data for journey %s", self.config[CONF_START_AREA][CONF_AREA_LABEL])
+        # Requests sent while refreshing are counted in the metrics of the route
+        token = current_route_metrics.set(self.metrics)
+        started = monotonic()
+        failed = True
+        try:
+            journeys = await self._async_update_journeys()
+            failed = False
+            return journeys
+        finally:
+            self.metrics.record_update(monotonic() - started, failed)
+            current_route_metrics.reset(token)
+            self._apply_refresh_interval()
+
+    async def _async_update_journeys(self):
+        _LOGGER.info("Fetch data for journey %s", self.label)
         try:
             async with async_timeout.timeout(30):
                 if self.last_journey:
-                    journeys = await self.hass.async_add_executor_job(
-                        self.journey_service.get_last_direct_journey,
+                    journeys = await self.journey_service.async_get_last_direct_journey_from_timetable(
                         self.start_area,
-                        self.end_area
+                        self.end_area,
+                        await self._async_get_timetable(),
+                        self.timezone,
+                        self.max_transfers
                     )
+                    self._async_save(journeys)
                 else:
 
                     if self._pause_update:
-                        if datetime.now().astimezone(pytz.utc) > self._pause_interval.astimezone(pytz.utc):
+                        if dt_util.utcnow() > self._pause_interval:
                             _LOGGER.debug("Pause is now resumed as the next journey is in less than one hour : %s", self._pause_interval)
                             self._pause_update = False
                             self._pause_interval = None
@@ -113,31 +503,59 @@ class JourneyCoordinator(DataUpdateCoordinator):
                             journeys = self._next_journeys
 
                     if not self._pause_update: 
-                        journeys = await self.hass.async_add_executor_job(
-                            self.journey_service.get_direct_journeys,
+                        # Entities only need a snapshot, the objects of the sncf library are dropped right away
+                        journeys = route_snapshot(await self.journey_service.async_get_journeys(
                             self.start_area,
                             self.end_area,
-                            self.config[CONF_JOURNEYS_COUNT]
-                        )
+                            self.config[CONF_JOURNEYS_COUNT] + self._prefetch,
+                            self.max_transfers
+                        ), self.timezone)
+                        self._async_save(journeys)
+
+                        if self._conf_adaptive_polling:
+                            self._adapt_refresh_interval(journeys)
 
                         # Enable "PAUSE UPDATE" between closing time and opening time
-                        if self._conf_pause_update_experimental:
+                        elif self._conf_pause_update_experimental:
                             _LOGGER.debug("Pause update configuration enabled")
                             self._next_journeys = journeys
-                            next_departure_journey = self._timezone.localize(journeys.journeys[0].journey.departure_date_time).astimezone(pytz.utc)
+                            next_departure_journey = dt_util.as_utc(journeys.journeys[0].departure)
                         
-                            if next_departure_journey.date() == (datetime.now().astimezone(pytz.utc).date() + timedelta(days=1)):
+                            if next_departure_journey.date() == (dt_util.utcnow().date() + timedelta(days=1)):
                                 self._pause_update = True
                                 self._pause_interval = next_departure_journey - timedelta(hours=1)
                                 _LOGGER.debug("Pausing update because the next journey is the next day and in more than one hour : %s", self._pause_interval)
 
 
-                _LOGGER.debug("Api calls count %s", self.repository_manager._query_count)
+                self._buffer = journeys
+                journeys = self._serve(journeys)
+                self._diff_journeys(journeys)
+                self._failures = 0
+                if self.stale:
+                    # Entities write their state to drop the stale flag
+                    self.stale = False
+                    self.changed_journeys = set(range(len(journeys.journeys)))
+                _LOGGER.debug("Journeys changed: %s", sorted(self.changed_journeys))
+                _LOGGER.debug("Api calls count %s, %s for this route", self.client.request_count, self.metrics.requests)
                 
                 _LOGGER.info("data sucessfully fetched")
                 return journeys
         except Exception as err:
-            _LOGGER.error("Failed to fetch API : %s", err)
-            raise UpdateFailed(f"Error fetching api data: {err}")
+            self._failures += 1
+            if self._conf_adaptive_polling:
+                self._base_interval = self.scan_interval
+
+            if self.data is not None and self.fetched_at is not None and dt_util.utcnow() - self.fetched_at <= self.cache_max_age:
+                _LOGGER.warning("Failed to fetch API for journey %s, journeys fetched at %s are kept: %s", self.label, self.fetched_at, err)
+                self.changed_journeys = set()
+                if not self.stale:
+                    self.stale = True
+                    self.attributes.set_stale(self.fetched_at)
+                    self.changed_journeys = set(range(len(self.data.journeys)))
+                return self.data
+
+            _LOGGER.error("Failed to fetch API for journey %s: %s", self.label, err)
+            self.changed_journeys = set()
+            raise UpdateFailed(f"Error fetching api data of journey {self.label}: {err}")
         
     
\ No newline at end of file
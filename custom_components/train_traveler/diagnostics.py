@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_API_KEY, CONF_WEBHOOK_ID
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN, CONF_CONNECTION, DATA_METRICS, DATA_ROUTES, COORDINATOR_TYPES
+
+TO_REDACT = {CONF_API_KEY, CONF_WEBHOOK_ID}
+
+
+def coordinator_diagnostics(coordinator) -> dict:
+    return {
+        "last_update_success": coordinator.last_update_success,
+        "stale": coordinator.stale,
+        "scan_interval": coordinator.scan_interval.total_seconds(),
+        "refresh_interval": coordinator.refresh_interval.total_seconds(),
+        "fetched_at": coordinator.fetched_at.isoformat() if coordinator.fetched_at is not None else None,
+        "journeys": len(coordinator.data.journeys) if coordinator.data is not None else None
+    }
+
+
+def route_diagnostics(route: dict) -> dict:
+    return {
+        "route_metrics": route[DATA_METRICS].as_dict(),
+        "coordinators": {
+            coordinator_type: coordinator_diagnostics(route[coordinator_type])
+            for coordinator_type in COORDINATOR_TYPES
+            if coordinator_type in route
+        }
+    }
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict:
+    """Return diagnostics of a route, or of each route of a multi-route entry, with the API usage of its API key."""
+    entry_data = hass.data[DOMAIN][entry.entry_id]
+    if DATA_ROUTES in entry_data:
+        routes = {"routes": {route_id: route_diagnostics(route) for route_id, route in entry_data[DATA_ROUTES].items()}}
+    else:
+        routes = route_diagnostics(entry_data)
+
+    return {
+        "entry": async_redact_data(entry.data, TO_REDACT),
+        "options": async_redact_data(dict(entry.options), TO_REDACT),
+        **routes,
+        "connection_metrics": entry_data[CONF_CONNECTION].metrics.as_dict(),
+        "connection_entries": entry_data[CONF_CONNECTION].references,
+        "connection_quota": entry_data[CONF_CONNECTION].limiter.as_dict(),
+        "connection_circuit_breaker": entry_data[CONF_CONNECTION].breaker.as_dict()
+    }
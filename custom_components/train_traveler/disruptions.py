@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable, Iterable
+from datetime import datetime, timedelta
+import logging
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN, DATA_DISRUPTION_FEEDS, DISRUPTION_FEED_INTERVAL, DISRUPTION_FEED_MAX_AGE
+from .api import SncfApiClient
+from .repositories import SharedDisruptionRepository
+from .snapshot import PushedDisruption
+
+from sncf.entities.journey_entity import JourneyEntity
+from sncf.entities.disruption_entity import DisruptionEntity
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def journey_disruption_ids(journey: JourneyEntity) -> list[str]:
+    return [
+        disruption_id
+        for section in journey.sections
+        for disruption_id in section.informations.disruptions_ids
+    ]
+
+
+class DisruptionFeed(object):
+    """Disruptions of the lines used by the routes of a connection.
+
+    Disruptions are fetched once per line every DISRUPTION_FEED_INTERVAL, for
+    every route using that line, and indexed by id so journeys get their
+    disruptions with lookups. Disruptions missing from the line feeds are
+    fetched one by one as before.
+
+    Disruptions can also be pushed, by the webhook of an entry, and are
+    then applied by the coordinators to the journeys they already fetched.
+    """
+
+    def __init__(self, client: SncfApiClient, interval: timedelta = DISRUPTION_FEED_INTERVAL):
+        self.interval = interval
+        self._repository = SharedDisruptionRepository(client)
+
+        self._disruptions: dict[str, tuple[datetime, DisruptionEntity]] = {}
+        self._lines: dict[str, tuple[datetime, list[str]]] = {}
+
+        self._pushed: dict[str, PushedDisruption] = {}
+        self._listeners: list[Callable[[], None]] = []
+
+    def _fresh(self, fetched_at: datetime, now: datetime) -> bool:
+        return now - fetched_at < self.interval
+
+    def _drop_expired(self, now: datetime) -> None:
+        self._lines = {
+            line_id: line for line_id, line in self._lines.items()
+            if now - line[0] < DISRUPTION_FEED_MAX_AGE
+        }
+        self._disruptions = {
+            disruption_id: disruption for disruption_id, disruption in self._disruptions.items()
+            if now - disruption[0] < DISRUPTION_FEED_MAX_AGE
+        }
+
+    def _missing(self, disruption_ids, now: datetime) -> set[str]:
+        return {
+            disruption_id for disruption_id in disruption_ids
+            if disruption_id not in self._disruptions or not self._fresh(self._disruptions[disruption_id][0], now)
+        }
+
+    async def async_refresh_lines(self, line_ids) -> None:
+        """Fetch the disruptions of the lines not fetched during the last interval."""
+        now = dt_util.utcnow()
+        stale = [
+            line_id for line_id in set(line_ids)
+            if line_id not in self._lines or not self._fresh(self._lines[line_id][0], now)
+        ]
+        if not stale:
+            return
+
+        results = await asyncio.gather(*[
+            self._repository.async_find_disruptions_by_line_id(line_id) for line_id in stale
+        ], return_exceptions=True)
+
+        now = dt_util.utcnow()
+        for line_id, disruptions in zip(stale, results):
+            if isinstance(disruptions, Exception):
+                # Disruptions of this line will be fetched one by one
+                _LOGGER.debug("Disruption feed of line %s unavailable: %s", line_id, disruptions)
+                continue
+            self._lines[line_id] = (now, [disruption.id for disruption in disruptions])
+            for disruption in disruptions:
+                self._disruptions[disruption.id] = (now, disruption)
+        self._drop_expired(now)
+
+    async def async_get_journeys_disruptions(self, journeys: list[JourneyEntity], journeys_lines: list[str | None]) -> list[list[DisruptionEntity]]:
+        """Return the disruptions of each journey, in the order of the journey sections.
+
+        journeys_lines is the id of the line of each journey, None when
+        unknown. Only the lines of journeys with disruptions missing from the
+        feed are fetched, the other missing disruptions are fetched one by one.
+        A disruption which cannot be fetched is left out.
+        """
+        now = dt_util.utcnow()
+        lines = {
+            line_id for journey, line_id in zip(journeys, journeys_lines)
+            if line_id is not None and self._missing(journey_disruption_ids(journey), now)
+        }
+        if lines:
+            await self.async_refresh_lines(lines)
+
+        missing = self._missing({disruption_id for journey in journeys for disruption_id in journey_disruption_ids(journey)}, dt_util.utcnow())
+        if missing:
+            missing = list(missing)
+            disruptions = await asyncio.gather(*[
+                self._repository.async_find_disruption_by_id(disruption_id) for disruption_id in missing
+            ], return_exceptions=True)
+            now = dt_util.utcnow()
+            for disruption_id, disruption in zip(missing, disruptions):
+                if isinstance(disruption, Exception):
+                    _LOGGER.warning("Disruption %s unavailable: %s", disruption_id, disruption)
+                    continue
+                self._disruptions[disruption_id] = (now, disruption)
+            self._drop_expired(now)
+
+        return [
+            [
+                self._disruptions[disruption_id][1]
+                for disruption_id in journey_disruption_ids(journey)
+                if disruption_id in self._disruptions
+            ]
+            for journey in journeys
+        ]
+
+    def pushed_disruptions(self) -> dict[str, PushedDisruption]:
+        """Return the disruptions pushed during the last DISRUPTION_FEED_MAX_AGE, by id."""
+        if not self._pushed:
+            return self._pushed
+
+        now = dt_util.utcnow()
+        if any(now - disruption.received_at >= DISRUPTION_FEED_MAX_AGE for disruption in self._pushed.values()):
+            self._pushed = {
+                disruption_id: disruption for disruption_id, disruption in self._pushed.items()
+                if now - disruption.received_at < DISRUPTION_FEED_MAX_AGE
+            }
+        return self._pushed
+
+    @callback
+    def async_push(self, disruptions: Iterable[PushedDisruption]) -> None:
+        """Keep disruptions pushed to the integration, replacing the ones with the same id, and notify the coordinators."""
+        self._pushed = {**self.pushed_disruptions(), **{disruption.id: disruption for disruption in disruptions}}
+        for update_callback in list(self._listeners):
+            update_callback()
+
+    @callback
+    def async_add_listener(self, update_callback: Callable[[], None]) -> CALLBACK_TYPE:
+        """Call update_callback when disruptions are pushed, return a function removing it."""
+        self._listeners.append(update_callback)
+
+        @callback
+        def remove_listener() -> None:
+            self._listeners.remove(update_callback)
+
+        return remove_listener
+
+
+@callback
+def async_get_disruption_feed(hass: HomeAssistant, client: SncfApiClient) -> DisruptionFeed:
+    """Return the disruption feed shared by the routes using client."""
+    feeds: dict[tuple, DisruptionFeed] = hass.data[DOMAIN].setdefault(DATA_DISRUPTION_FEEDS, {})
+    feed = feeds.get(client.key)
+    if feed is None:
+        feed = feeds[client.key] = DisruptionFeed(client)
+    return feed
+
+
+@callback
+def async_drop_disruption_feed(hass: HomeAssistant, client: SncfApiClient) -> None:
+    """Drop the disruption feed of a client once no route uses it anymore."""
+    if client.references <= 0:
+        hass.data[DOMAIN].get(DATA_DISRUPTION_FEEDS, {}).pop(client.key, None)
@@ -1,14 +1,95 @@
 import logging
-import pytz
+from datetime import datetime
 
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.core import callback
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers import entity_registry as er
 
 
 from .const import DOMAIN, VERSION
 
 _LOGGER = logging.getLogger(__name__)
 
+
+def route_device_info(coordinator):
+    # Both directions of a bidirectional route share the device of the route
+    start, end = (coordinator.data.end, coordinator.data.start) if coordinator.reverse else (coordinator.data.start, coordinator.data.end)
+    device_info = {
+        "identifiers": {(DOMAIN, coordinator.route_key)},
+        "name": f"{start.name} - {end.name}",
+        "sw_version": VERSION,
+        "entry_type": None,
+    }
+    if coordinator.route_id is not None:
+        # Routes of a multi-route entry are sub-devices of the device of the entry
+        device_info["via_device"] = (DOMAIN, coordinator.entry.entry_id)
+    return device_info
+
+
+def route_unique_id(coordinator, unique_id: str) -> str:
+    # Return journeys use the stations of an entry of the opposite direction, if any
+    if coordinator.reverse:
+        unique_id = f"return_{unique_id}"
+    # Routes of a multi-route entry may use the same stations as other entries
+    if coordinator.route_id is None:
+        return unique_id
+    return f"{coordinator.route_id}_{unique_id}"
+
+
+class JourneyEntityManager(object):
+    """Add the entities of the journeys of a coordinator as they show up.
+
+    Entities of a journey are added the first time a refresh returns it, up
+    to the number of journeys of the coordinator. They are kept when later
+    refreshes return fewer journeys and are unavailable meanwhile, so the
+    entry never has to be reloaded. When the number of journeys of the
+    coordinator is lowered, entities of the journeys beyond are removed.
+    """
+
+    def __init__(self, coordinator, type, factory, async_add_entities: AddEntitiesCallback):
+        self.coordinator = coordinator
+        self.type = type
+        self.factory = factory
+        self.async_add_entities = async_add_entities
+        self._count = 0
+        # Entities of each journey
+        self._entities: list[list] = []
+
+    @callback
+    def _async_remove_entities(self, count: int) -> None:
+        _LOGGER.debug("Remove %s journeys entities #%s to #%s", self.type, count + 1, self._count)
+        registry = er.async_get(self.coordinator.hass)
+        for entities in self._entities[count:]:
+            for entity in entities:
+                # Removing the registry entry removes the entity
+                if entity.registry_entry is not None:
+                    registry.async_remove(entity.entity_id)
+        del self._entities[count:]
+        self._count = count
+
+    @callback
+    def async_update(self) -> None:
+        if self.coordinator.journeys_count < self._count:
+            self._async_remove_entities(self.coordinator.journeys_count)
+
+        count = min(len(self.coordinator.data.journeys), self.coordinator.journeys_count)
+        if count <= self._count:
+            return
+
+        _LOGGER.debug("Add %s journeys entities #%s to #%s", self.type, self._count + 1, count)
+        entities = [self.factory(self.coordinator, index, self.type) for index in range(self._count, count)]
+        self._entities.extend(entities)
+        self._count = count
+        self.async_add_entities([entity for journey_entities in entities for entity in journey_entities])
+
+    @callback
+    def async_setup(self, entry: ConfigEntry) -> None:
+        self.async_update()
+        entry.async_on_unload(self.coordinator.async_add_listener(self.async_update))
+
+
 class JourneyBaseEntity(CoordinatorEntity):
 
 
@@ -21,14 +102,39 @@ class JourneyBaseEntity(CoordinatorEntity):
         self.start_label = self.coordinator.data.start.label
         self.end_label = self.coordinator.data.end.label
         self.data = self.coordinator.data.journeys[self.index]
-        self.timezone = pytz.timezone("Europe/Paris")
+        self._last_available = self.available
 
         _LOGGER.debug("Init %s Journey #%s %s - %s", self.type, (self.index + 1), self.start_label, self.end_label)
 
+    @property
+    def available(self) -> bool:
+        # Fewer journeys than entities can be returned, at the end of the service for instance
+        return super().available and self.index < len(self.coordinator.data.journeys)
+
     @callback
     def _handle_coordinator_update(self) -> None:
-        self.data = self.coordinator.data.journeys[self.index]
-        self._handle_journey_update()
+        # The state is still written when the entity becomes available or unavailable
+        available = self.available
+        if available == self._last_available and not self.journey_changed():
+            return
+
+        self._last_available = available
+        if self.index < len(self.coordinator.data.journeys):
+            self.data = self.coordinator.data.journeys[self.index]
+            self._handle_journey_update()
+        else:
+            self.async_write_ha_state()
+
+    def journey_changed(self) -> bool:
+        return self.index in self.coordinator.changed_journeys
+
+    @property
+    def departure_time(self) -> datetime:
+        return self.data.departure
+
+    @property
+    def arrival_time(self) -> datetime:
+        return self.data.arrival
 
     
     def _handle_journey_update(self) -> None:
@@ -37,25 +143,14 @@ class JourneyBaseEntity(CoordinatorEntity):
     @property
     def device_info(self):
         """Return device information about this entity."""
-        return {
-            "identifiers": {(DOMAIN, self.coordinator.entry.entry_id)},
-            "name": f"{self.coordinator.data.start.name} - {self.coordinator.data.end.name}",
-            "sw_version": VERSION,
-            "entry_type": None,
-        }
+        return route_device_info(self.coordinator)
+
+    @property
+    def unique_id(self) -> str | None:
+        return route_unique_id(self.coordinator, self._attr_unique_id)
     
     def short_start_name(self):
         return self.start_label.replace(" ", "")[0:3].lower()
     
     def short_end_name(self):
         return self.end_label.replace(" ", "")[0:3].lower()
-    
-    def get_delay(self, disruptions, start_point):
-        delay = None
-        if len(disruptions) > 0:
-            if disruptions[0].severity_effect == "SIGNIFICANT_DELAYS":
-                for impacted_objects in disruptions[0].impacted_objects:
-                    for impacted_stop in impacted_objects.impacted_stops:
-                        if impacted_stop.stop_point.label == start_point:
-                            delay = (impacted_stop.ammended_departure_time - impacted_stop.base_departure_time).total_seconds()
-        return delay
\ No newline at end of file
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from .const import METRICS_LATENCY_BUCKETS
+
+
+class RequestMetrics(object):
+    """Counters of the requests sent to the SNCF API."""
+
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.bytes = 0
+        self.latency = 0.0
+        self.latency_histogram = [0] * (len(METRICS_LATENCY_BUCKETS) + 1)
+        # Requests answered without an API call, from the static cache or by joining an identical request
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.joined = 0
+
+    def record_request(self, latency: float, size: int, failed: bool) -> None:
+        self.requests += 1
+        self.bytes += size
+        self.latency += latency
+        self.latency_histogram[bisect_left(METRICS_LATENCY_BUCKETS, latency)] += 1
+        if failed:
+            self.failures += 1
+
+    def as_dict(self) -> dict:
+        buckets = [f"<={bucket}s" for bucket in METRICS_LATENCY_BUCKETS] + [f">{METRICS_LATENCY_BUCKETS[-1]}s"]
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "bytes": self.bytes,
+            "average_latency": round(self.latency / self.requests, 3) if self.requests else None,
+            "latency_histogram": dict(zip(buckets, self.latency_histogram)),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "joined_requests": self.joined
+        }
+
+
+class RouteMetrics(RequestMetrics):
+    """Counters of a route, with the requests sent while refreshing it."""
+
+    def __init__(self):
+        super().__init__()
+        self.updates = 0
+        self.update_failures = 0
+        self.update_time = 0.0
+        self.last_update_time: float | None = None
+
+    def record_update(self, duration: float, failed: bool) -> None:
+        self.updates += 1
+        self.update_time += duration
+        self.last_update_time = duration
+        if failed:
+            self.update_failures += 1
+
+    def as_dict(self) -> dict:
+        return {
+            **super().as_dict(),
+            "updates": self.updates,
+            "update_failures": self.update_failures,
+            "average_update_time": round(self.update_time / self.updates, 3) if self.updates else None,
+            "last_update_time": round(self.last_update_time, 3) if self.last_update_time is not None else None
+        }
+
+
+# Metrics of the route being refreshed, requests of the shared client are also counted there
+current_route_metrics: ContextVar[RouteMetrics | None] = ContextVar("current_route_metrics", default=None)
+
+
+def route_metrics() -> tuple[RequestMetrics, ...]:
+    metrics = current_route_metrics.get()
+    return (metrics,) if metrics is not None else ()
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+import logging
+from time import monotonic
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import DOMAIN, DATA_PLACES, PLACES_CACHE_SIZE, PLACES_CACHE_TTL
+from .api import SncfApiClient
+from .repositories import SharedPlaceRepository
+
+from sncf.entities.place_entity import PlaceAreaEntity
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def place_key(client: SncfApiClient, search: str) -> tuple:
+    # Places do not depend on the API key, only on the API and its region
+    return (client.connection.root_url, client.connection.region, " ".join(search.split()).casefold())
+
+
+class PlaceSearchCache(object):
+    """Stop areas found for a search, shared by every config and options flow.
+
+    Results are kept PLACES_CACHE_TTL seconds, for the PLACES_CACHE_SIZE last
+    searches. Searches without any stop area are not kept, so a place
+    created meanwhile is found when the search is retried.
+    """
+
+    def __init__(self, size: int = PLACES_CACHE_SIZE, ttl: float = PLACES_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._places: OrderedDict[tuple, tuple[float, list[PlaceAreaEntity]]] = OrderedDict()
+
+    def get(self, key: tuple) -> list[PlaceAreaEntity] | None:
+        entry = self._places.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= monotonic():
+            del self._places[key]
+            return None
+        self._places.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: tuple, areas: list[PlaceAreaEntity]) -> None:
+        self._places[key] = (monotonic() + self.ttl, areas)
+        self._places.move_to_end(key)
+        while len(self._places) > self.size:
+            self._places.popitem(last=False)
+
+    async def async_find_areas(self, client: SncfApiClient, search: str) -> list[PlaceAreaEntity]:
+        key = place_key(client, search)
+        areas = self.get(key)
+        if areas is not None:
+            _LOGGER.debug("Stop areas of '%s' found in cache", search)
+            return areas
+
+        # Identical searches running at the same time are joined by the client
+        areas = await SharedPlaceRepository(client).async_find_areas_from_places(search)
+        if areas:
+            self.set(key, areas)
+        return areas
+
+
+@callback
+def async_get_place_cache(hass: HomeAssistant) -> PlaceSearchCache:
+    """Return the place search cache shared by the flows."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    cache = domain_data.get(DATA_PLACES)
+    if cache is None:
+        cache = domain_data[DATA_PLACES] = PlaceSearchCache()
+    return cache
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from .const import (
+    ADAPTIVE_MIN_INTERVAL,
+    ADAPTIVE_APPROACH_INTERVAL,
+    ADAPTIVE_DISRUPTED_INTERVAL,
+    ADAPTIVE_IDLE_INTERVAL,
+    ADAPTIVE_LEAD_TIME,
+    ADAPTIVE_BACKOFF_THRESHOLD
+)
+
+
+def adaptive_refresh_interval(departures: list[datetime], disrupted: bool, now: datetime, scan_interval: timedelta) -> timedelta:
+    """Return the delay before the next poll of a route from its fetched timetable.
+
+    - no train at all: poll at most every ADAPTIVE_IDLE_INTERVAL
+    - every train has left: poll again soon
+    - a disruption is active or the next train leaves within the lead time:
+      poll often, at most every scan_interval
+    - the next train leaves within the backoff threshold: poll at scan_interval
+      but make sure a poll happens when the lead time starts
+    - the next train is hours away (typically overnight): sleep until the lead
+      time of that train starts
+    """
+    if not departures:
+        return max(scan_interval, ADAPTIVE_IDLE_INTERVAL)
+
+    upcoming = [departure for departure in departures if departure > now]
+    if not upcoming:
+        # Every fetched train has already left, the timetable is outdated
+        return max(min(scan_interval, ADAPTIVE_APPROACH_INTERVAL), ADAPTIVE_MIN_INTERVAL)
+
+    until_departure = min(upcoming) - now
+
+    if disrupted:
+        interval = min(scan_interval, ADAPTIVE_DISRUPTED_INTERVAL)
+    elif until_departure <= ADAPTIVE_LEAD_TIME:
+        # Poll again right after the train has left so the next one shows up
+        interval = min(scan_interval, ADAPTIVE_APPROACH_INTERVAL, until_departure + ADAPTIVE_MIN_INTERVAL)
+    elif until_departure <= ADAPTIVE_BACKOFF_THRESHOLD:
+        interval = min(scan_interval, until_departure - ADAPTIVE_LEAD_TIME)
+    else:
+        interval = until_departure - ADAPTIVE_LEAD_TIME
+
+    return max(interval, ADAPTIVE_MIN_INTERVAL)
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import date, datetime, time, timedelta
+import logging
+from time import monotonic
+
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    DEFAULT_DAILY_QUOTA,
+    STORAGE_SAVE_DELAY,
+    RATE_LIMIT_RATE,
+    RATE_LIMIT_BURST,
+    QUOTA_LOW_PRIORITY_HEADROOM,
+    QUOTA_HIGH_PRIORITY_HEADROOM,
+    QUOTA_MAX_STRETCH
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class QuotaExceededError(Exception):
+    """The daily quota of the API key is spent."""
+
+
+class RateLimiter(object):
+    """Token bucket and daily quota of an API key.
+
+    Requests wait for a token of the bucket, so routes refreshed together
+    do not burst the API, and are refused once the daily quota is spent.
+    The quota resets at midnight, Paris time. With a store, the requests
+    sent today are saved and restored when the client is set up, so
+    restarts and reloads do not reset the quota.
+
+    Polling intervals are stretched when the quota is spent faster than the
+    day goes by: the headroom is the share of the quota left divided by the
+    share of the day left. Low priority refreshes (last journey) back off as
+    soon as the headroom goes below QUOTA_LOW_PRIORITY_HEADROOM, high
+    priority ones (next journeys) below QUOTA_HIGH_PRIORITY_HEADROOM.
+    """
+
+    def __init__(
+            self, daily_quota: int = DEFAULT_DAILY_QUOTA, rate: float = RATE_LIMIT_RATE, burst: int = RATE_LIMIT_BURST, store: Store | None = None
+    ):
+        self.daily_quota = daily_quota
+        self.rate = rate
+        self.burst = burst
+
+        self._timezone = dt_util.get_time_zone("Europe/Paris")
+        self._tokens = float(burst)
+        self._updated = monotonic()
+        self._day: date | None = None
+        self._used = 0
+        self._lock = asyncio.Lock()
+        self._store = store
+        self._restored = store is None
+
+    def _now(self) -> datetime:
+        return dt_util.now(self._timezone)
+
+    def _reset_day(self, now: datetime) -> None:
+        if self._day != now.date():
+            self._day = now.date()
+            self._used = 0
+
+    @property
+    def used(self) -> int:
+        self._reset_day(self._now())
+        return self._used
+
+    @property
+    def remaining(self) -> int:
+        return max(self.daily_quota - self.used, 0)
+
+    def _check_quota(self) -> None:
+        self._reset_day(self._now())
+        if self._used >= self.daily_quota:
+            raise QuotaExceededError(f"Daily quota of {self.daily_quota} requests spent")
+
+    def consume(self) -> None:
+        """Count a request in the daily quota, raise QuotaExceededError when spent."""
+        self._check_quota()
+        self._used += 1
+        if self._store is not None:
+            self._store.async_delay_save(self._data_to_save, STORAGE_SAVE_DELAY)
+
+    def _data_to_save(self) -> dict:
+        return {"day": self._day.isoformat(), "used": self._used}
+
+    async def async_restore(self) -> None:
+        """Restore the requests sent today, once."""
+        if self._restored:
+            return
+        self._restored = True
+        stored = await self._store.async_load()
+        self._reset_day(self._now())
+        if stored is not None and stored.get("day") == self._day.isoformat():
+            # Requests may have been counted while loading
+            self._used = max(self._used, stored.get("used", 0))
+            _LOGGER.debug("%s requests already sent today with this API key", self._used)
+
+    async def async_flush(self) -> None:
+        """Save the requests sent today right away."""
+        if self._store is not None:
+            await self._store.async_flush()
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def async_acquire(self) -> None:
+        """Wait for a token of the bucket and count the request in the daily quota.
+
+        Requests cancelled while waiting are not counted.
+        """
+        self._check_quota()
+        async with self._lock:
+            await self.async_restore()
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self.consume()
+            self._tokens -= 1
+
+    def headroom(self) -> float:
+        now = self._now()
+        self._reset_day(now)
+        if self.daily_quota <= 0:
+            # No request allowed at all, as when the quota is spent
+            return 0.0
+        end_of_day = datetime.combine(now.date() + timedelta(days=1), time.min, tzinfo=self._timezone)
+        day_left = max((end_of_day - now).total_seconds() / 86400, 1 / 86400)
+        quota_left = max(self.daily_quota - self._used, 0) / self.daily_quota
+        return quota_left / day_left
+
+    def stretch_factor(self, low_priority: bool) -> float:
+        """Return by how much the polling interval of a route should be stretched."""
+        headroom = self.headroom()
+        threshold = QUOTA_LOW_PRIORITY_HEADROOM if low_priority else QUOTA_HIGH_PRIORITY_HEADROOM
+        if headroom >= threshold:
+            return 1.0
+        if headroom <= 0:
+            return QUOTA_MAX_STRETCH
+        return min(threshold / headroom, QUOTA_MAX_STRETCH)
+
+    def as_dict(self) -> dict:
+        return {
+            "daily_quota": self.daily_quota,
+            "used": self.used,
+            "remaining": self.remaining,
+            "headroom": round(self.headroom(), 3)
+        }
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import threading
+
+from .api import SncfApiClient, SncfApiError
+from .const import DISRUPTIONS_PAGE_SIZE
+
+from sncf.repositories.repository_manager import ApiRepository
+from sncf.repositories.journey_repository import ApiJourneyRepository
+from sncf.repositories.stop_area_repository import ApiStopAreaRepository
+from sncf.repositories.disruption_repository import ApiDisruptionRepository
+from sncf.repositories.place_repository import ApiPlaceRepository
+
+from sncf.entities.journey_entity import JourneyEntity
+from sncf.entities.disruption_entity import DisruptionEntity
+from sncf.entities.place_entity import PlaceAreaEntity
+from sncf.entities.stop_entity import StopPointEntity
+from sncf.entities.line_entity import LineEntity
+
+
+class PayloadResponse(object):
+    """Minimal stand-in for the response of the sncf library around an already fetched payload."""
+
+    def __init__(self, payload: dict):
+        self._payload = payload
+
+    def json(self) -> dict:
+        return self._payload
+
+
+class SharedRepositoryMixin(object):
+    """Send the requests of a sncf repository through a shared SncfApiClient.
+
+    The async_* methods fetch the payload with aiohttp and hand it to the
+    sncf library parser. The blocking methods of the library keep working
+    from a worker thread, their requests being sent by the client from the
+    event loop.
+    """
+
+    _client: SncfApiClient
+
+    def __init__(self, client: SncfApiClient):
+        super().__init__(client.connection)
+        self._client = client
+        # Payload being parsed by the thread running the parser, blocking methods may run while the loop parses
+        self._local = threading.local()
+
+    @property
+    def _payload(self) -> dict | None:
+        return getattr(self._local, "payload", None)
+
+    @_payload.setter
+    def _payload(self, payload: dict | None) -> None:
+        self._local.payload = payload
+
+    def query(self, endpoint: str) -> str:
+        return "{url}/{api}/{region}{route}{endpoint}".format(
+            url=self._connection.root_url,
+            api=self._api,
+            region=self._connection.region,
+            route=self._route,
+            endpoint=endpoint
+        )
+
+    def request(self, endpoint: str, parameters: dict = {}) -> PayloadResponse:
+        if self._payload is not None:
+            return PayloadResponse(self._payload)
+
+        payload = self._client.get(self.query(endpoint), parameters)
+        if payload is None or "error" in payload:
+            raise Exception(payload)
+        return PayloadResponse(payload)
+
+    async def async_parse(self, endpoint: str, parameters: dict, parser, *args, **kwargs):
+        """Fetch endpoint asynchronously then run the library parser on the payload."""
+        payload = await self._client.async_get(self.query(endpoint), parameters)
+        if payload is None or "error" in payload:
+            raise Exception(payload)
+
+        # Parsers are synchronous, no other coroutine can use the payload meanwhile
+        self._payload = payload
+        try:
+            return parser(*args, **kwargs)
+        finally:
+            self._payload = None
+
+    def validate_auth(self, api) -> bool:
+        try:
+            self._client.get("{url}/{api}".format(url=self._connection.root_url, api=api))
+        except SncfApiError:
+            return False
+        return True
+
+    async def async_validate_auth(self, api) -> bool:
+        """Return False when the credentials are refused, errors of a failing API are raised."""
+        try:
+            await self._client.async_get("{url}/{api}".format(url=self._connection.root_url, api=api))
+        except SncfApiError as err:
+            if err.unavailable:
+                raise
+            return False
+        return True
+
+
+class SharedRepository(SharedRepositoryMixin, ApiRepository):
+    pass
+
+
+class SharedJourneyRepository(SharedRepositoryMixin, ApiJourneyRepository):
+
+    async def async_find_journeys(self, start: str, end: str, **kwargs) -> list[JourneyEntity]:
+        parameters = {"from": start, "to": end}
+        parameters.update(kwargs)
+        parameters = self.convert_parameters_keys_to_array(parameters)
+
+        try:
+            return await self.async_parse("", parameters, self.find_journeys, start, end, **kwargs)
+        except SncfApiError as error:
+            if error.error_id == "no_solution":
+                return []
+            raise Exception("Error: Impossible to get journey from '{start}' to '{end}', {error}".format(start=start, end=end, error=error))
+
+
+class SharedDisruptionRepository(SharedRepositoryMixin, ApiDisruptionRepository):
+
+    async def async_find_disruptions_by_line_id(self, line_id: str) -> list[DisruptionEntity]:
+        """Fetch the current disruptions of a line impacting trips."""
+        query = "{url}/{api}/{region}/lines/{line_id}{route}".format(
+            url=self._connection.root_url,
+            api=self._api,
+            region=self._connection.region,
+            line_id=line_id,
+            route=self._route
+        )
+        try:
+            payload = await self._client.async_get(query, {"count": DISRUPTIONS_PAGE_SIZE})
+        except SncfApiError as error:
+            if error.error_id == "no_solution":
+                return []
+            raise Exception("Error: Impossible to get disruptions of line '{id}', {error}".format(id=line_id, error=error))
+
+        disruptions = []
+        for disruption in payload.get("disruptions", []):
+            self._payload = {"disruptions": [disruption]}
+            try:
+                disruptions.append(self.find_disruption_by_id(disruption["id"]))
+            except (KeyError, IndexError, TypeError, ValueError):
+                # Disruptions which do not impact a trip (a whole line, a station...) cannot be parsed
+                continue
+            finally:
+                self._payload = None
+
+        return disruptions
+
+    async def async_find_disruption_by_id(self, disruption_id: str) -> DisruptionEntity:
+        try:
+            return await self.async_parse("/{}".format(disruption_id), {}, self.find_disruption_by_id, disruption_id)
+        except SncfApiError as error:
+            raise Exception("Error: Impossible to get disruption id '{id}', {error}".format(id=disruption_id, error=error))
+
+
+class SharedPlaceRepository(SharedRepositoryMixin, ApiPlaceRepository):
+
+    async def async_find_areas_from_places(self, search: str) -> list[PlaceAreaEntity]:
+        return await self.async_parse(
+            "",
+            {"q": search, "disable_geojson": True, "type[]": ["stop_area"]},
+            self.find_areas_from_places,
+            search
+        )
+
+
+class SharedStopAreaRepository(SharedRepositoryMixin, ApiStopAreaRepository):
+    """Stop area repository caching lines and stop points on the shared client."""
+
+    async def async_find_area_stop_point_by_line_id(self, stop_area_id: str, line_id: str) -> StopPointEntity:
+        return await self._client.async_cached(
+            ("stop_point", stop_area_id, line_id),
+            lambda: self.async_parse(
+                "/{stop_area_id}/lines/{line_id}/stop_points".format(stop_area_id=stop_area_id, line_id=line_id),
+                {},
+                self.find_area_stop_point_by_line_id,
+                stop_area_id,
+                line_id
+            )
+        )
+
+    async def async_find_lines_by_stop_area_id(self, stop_area_id: str) -> list[LineEntity]:
+        return await self._client.async_cached(
+            ("lines", stop_area_id),
+            lambda: self.async_parse(
+                "/{}/lines".format(stop_area_id),
+                {"count": 200},
+                self.find_lines_by_stop_area_id,
+                stop_area_id
+            )
+        )
+
+    async def async_find_stop_area_timezone(self, stop_area_id: str) -> str | None:
+        """Return the timezone of a stop area, times of its journeys are local to it."""
+        async def async_fetch() -> str | None:
+            payload = await self._client.async_get(self.query("/{}".format(stop_area_id)), {})
+            stop_areas = payload.get("stop_areas", []) if isinstance(payload, dict) else []
+            return stop_areas[0].get("timezone") if stop_areas else None
+
+        return await self._client.async_cached(("timezone", stop_area_id), async_fetch)
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+import logging
+import random
+
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    BACKOFF_MIN_DELAY,
+    BACKOFF_MAX_DELAY,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_MIN_OPEN_DURATION,
+    BREAKER_MAX_OPEN_DURATION
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def backoff_delay(failures: int, maximum: timedelta = BACKOFF_MAX_DELAY) -> timedelta:
+    """Return the delay before retrying after consecutive failures.
+
+    The delay doubles with each failure, from BACKOFF_MIN_DELAY up to maximum,
+    and a random part of up to half of it is removed so routes sharing an API
+    key do not retry all at once.
+    """
+    delay = min(BACKOFF_MIN_DELAY * (2 ** max(failures - 1, 0)), max(maximum, BACKOFF_MIN_DELAY))
+    return delay * random.uniform(0.5, 1)
+
+
+class CircuitOpenError(Exception):
+    """Requests are not sent while the API is failing."""
+
+
+class CircuitBreaker(object):
+    """Stop sending requests to an API failing for every route of a connection.
+
+    After BREAKER_FAILURE_THRESHOLD failed requests in a row the circuit
+    opens and requests fail right away. Once the open duration is over, a
+    single probe request is let through: the circuit closes when it
+    succeeds, and opens again for twice as long when it fails.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.open_duration = BREAKER_MIN_OPEN_DURATION
+        self.opened_at: datetime | None = None
+        self._probing = False
+
+    def time_until_probe(self) -> timedelta:
+        if self.state != self.OPEN:
+            return timedelta(0)
+        return max(self.opened_at + self.open_duration - dt_util.utcnow(), timedelta(0))
+
+    def before_request(self) -> None:
+        """Raise CircuitOpenError when the request must not be sent."""
+        if self.state == self.OPEN:
+            if self.time_until_probe() > timedelta(0):
+                raise CircuitOpenError(f"API unavailable, next attempt in {self.time_until_probe()}")
+            _LOGGER.debug("Probing the API with a single request")
+            self.state = self.HALF_OPEN
+            self._probing = False
+
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                raise CircuitOpenError("API unavailable, waiting for the probe request")
+            self._probing = True
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            _LOGGER.info("API available again, resuming requests")
+        self.state = self.CLOSED
+        self.failures = 0
+        self.open_duration = BREAKER_MIN_OPEN_DURATION
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN:
+            self.open_duration = min(self.open_duration * 2, BREAKER_MAX_OPEN_DURATION)
+            self._open()
+        elif self.state == self.CLOSED and self.failures >= BREAKER_FAILURE_THRESHOLD:
+            self._open()
+
+    def record_cancel(self) -> None:
+        # A cancelled probe tells nothing about the API, let another request probe it
+        self._probing = False
+
+    def _open(self) -> None:
+        _LOGGER.warning("API failing, requests suspended for %s", self.open_duration)
+        self.state = self.OPEN
+        self.opened_at = dt_util.utcnow()
+        self._probing = False
+
+    def as_dict(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "open_duration": self.open_duration.total_seconds(),
+            "time_until_probe": self.time_until_probe().total_seconds()
+        }
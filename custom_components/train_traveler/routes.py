@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from collections.abc import Mapping
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.config_entries import ConfigEntry
+
+from .const import CONF_MULTI_ROUTE, CONF_ROUTES, CONF_ROUTE_ID, CONF_LAST_JOURNEY, CONF_BIDIRECTIONAL, DATA_ROUTES, COORDINATOR_TYPES
+
+
+def is_multi_route(entry: ConfigEntry) -> bool:
+    return entry.data.get(CONF_MULTI_ROUTE, False)
+
+
+def entry_route_ids(entry: ConfigEntry) -> list[str | None]:
+    """Return the ids of the routes of an entry, None being the single route of a regular entry."""
+    if not is_multi_route(entry):
+        return [None]
+    return [route[CONF_ROUTE_ID] for route in entry.options.get(CONF_ROUTES, [])]
+
+
+def route_key(entry_id: str, route_id: str | None) -> str:
+    """Identify a route among every entry, for its device and its cached journeys."""
+    return entry_id if route_id is None else f"{entry_id}_{route_id}"
+
+
+def entry_settings(entry: ConfigEntry) -> dict:
+    """Return the settings of an entry, the ones changed from the options flow replacing the ones of the config flow."""
+    return {**entry.data, **{key: value for key, value in entry.options.items() if key != CONF_ROUTES}}
+
+
+def route_config(entry: ConfigEntry, route_id: str | None) -> Mapping:
+    """Return the configuration of a route, the settings of a multi-route entry apply to each of its routes."""
+    if route_id is None:
+        return entry_settings(entry)
+
+    route = next(route for route in entry.options.get(CONF_ROUTES, []) if route[CONF_ROUTE_ID] == route_id)
+    return {**entry_settings(entry), **route}
+
+
+@callback
+def async_update_route(hass: HomeAssistant, entry: ConfigEntry, route_id: str | None, changes: dict) -> None:
+    """Save changes to the configuration of a route."""
+    if route_id is None:
+        hass.config_entries.async_update_entry(entry, data={**entry.data, **changes})
+        return
+
+    hass.config_entries.async_update_entry(entry, options={
+        **entry.options,
+        CONF_ROUTES: [
+            {**route, **changes} if route[CONF_ROUTE_ID] == route_id else route
+            for route in entry.options.get(CONF_ROUTES, [])
+        ]
+    })
+
+
+def route_journeys(config: Mapping) -> list[tuple[bool, bool]]:
+    """Return the journeys followed for a route, as (last journey, return direction) pairs."""
+    return [
+        (last_journey, reverse)
+        for reverse in (False, True)
+        for last_journey in (False, True)
+        if (not last_journey or config[CONF_LAST_JOURNEY]) and (not reverse or config.get(CONF_BIDIRECTIONAL, False))
+    ]
+
+
+def route_coordinators(route: dict) -> list:
+    """Return the coordinators set up for a route."""
+    return [route[coordinator_type] for coordinator_type in COORDINATOR_TYPES if coordinator_type in route]
+
+
+def routes_data(entry_data: dict) -> list[dict]:
+    """Return the coordinators of each route set up for an entry."""
+    if DATA_ROUTES in entry_data:
+        return list(entry_data[DATA_ROUTES].values())
+    return [entry_data]
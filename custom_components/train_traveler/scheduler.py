@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+import logging
+
+from homeassistant.core import HomeAssistant, CALLBACK_TYPE, callback
+from homeassistant.helpers.event import async_track_point_in_utc_time
+from homeassistant.util import dt as dt_util
+
+from .const import DATA_SCHEDULERS, DEFAULT_MAX_CONCURRENT_REFRESH, DOMAIN, SCHEDULER_BATCH_WINDOW
+from .api import SncfApiClient
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class RouteScheduler(object):
+    """Refresh every route sharing a client in a single scheduled pass.
+
+    The scheduler wakes up when the first route is due and refreshes, in the
+    same pass, every route due within SCHEDULER_BATCH_WINDOW, with at most
+    max_concurrent refreshes running at the same time. Results are pushed to
+    the listeners of each coordinator as with a regular refresh.
+    """
+
+    def __init__(self, hass: HomeAssistant, client: SncfApiClient):
+        self.hass = hass
+        self.client = client
+
+        self._coordinators: dict = {}
+        self._last_refresh: dict = {}
+        self._refreshing = False
+        self._unsub_refresh: CALLBACK_TYPE | None = None
+
+    @property
+    def max_concurrent(self) -> int:
+        # Entries saved before the minimum was enforced may allow none, refreshes would then wait forever
+        return max(min(self._coordinators.values(), default=DEFAULT_MAX_CONCURRENT_REFRESH), 1)
+
+    @property
+    def empty(self) -> bool:
+        return len(self._coordinators) == 0
+
+    @callback
+    def async_add(self, coordinator, max_concurrent: int = DEFAULT_MAX_CONCURRENT_REFRESH) -> None:
+        """Take over the scheduling of a coordinator."""
+        self._coordinators[coordinator] = max_concurrent
+        self._last_refresh[coordinator] = dt_util.utcnow()
+        # Without update_interval the coordinator does not schedule its own refreshes
+        coordinator.update_interval = None
+        coordinator.scheduler = self
+        self._async_schedule_next()
+
+    @callback
+    def async_remove(self, coordinator) -> None:
+        if self._coordinators.pop(coordinator, None) is not None:
+            coordinator.scheduler = None
+        self._last_refresh.pop(coordinator, None)
+        self._async_schedule_next()
+
+    @callback
+    def async_request_refresh(self, coordinator) -> None:
+        """Refresh a coordinator in the next pass, with the other routes due by then.
+
+        The pass starts right away, or after the running one.
+        """
+        if coordinator not in self._coordinators:
+            return
+
+        self._last_refresh[coordinator] = dt_util.utcnow() - coordinator.refresh_interval
+        self._async_schedule_next()
+
+    @callback
+    def async_reschedule(self) -> None:
+        """Schedule the next pass again, after the refresh interval of a coordinator changed."""
+        self._async_schedule_next()
+
+    def _next_refresh(self, coordinator) -> datetime:
+        return self._last_refresh[coordinator] + coordinator.refresh_interval
+
+    @callback
+    def _async_schedule_next(self) -> None:
+        # Rescheduled at the end of the running pass
+        if self._refreshing:
+            return
+
+        if self._unsub_refresh is not None:
+            self._unsub_refresh()
+            self._unsub_refresh = None
+
+        if self.empty:
+            return
+
+        next_refresh = min(self._next_refresh(coordinator) for coordinator in self._coordinators)
+        _LOGGER.debug("Next refresh of %s routes at %s", len(self._coordinators), next_refresh)
+        self._unsub_refresh = async_track_point_in_utc_time(self.hass, self._async_refresh_due, next_refresh)
+
+    async def _async_refresh_due(self, now: datetime) -> None:
+        self._unsub_refresh = None
+        due = [
+            coordinator for coordinator in self._coordinators
+            if self._next_refresh(coordinator) <= now + SCHEDULER_BATCH_WINDOW
+        ]
+
+        _LOGGER.debug("Refreshing %s/%s routes, %s at a time", len(due), len(self._coordinators), self.max_concurrent)
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        async def async_refresh(coordinator) -> None:
+            async with semaphore:
+                await coordinator.async_refresh()
+            # The route may have been unloaded during the refresh
+            if coordinator in self._coordinators:
+                self._last_refresh[coordinator] = now
+
+        self._refreshing = True
+        try:
+            await asyncio.gather(*[async_refresh(coordinator) for coordinator in due])
+        finally:
+            self._refreshing = False
+            self._async_schedule_next()
+
+
+@callback
+def async_get_scheduler(hass: HomeAssistant, client: SncfApiClient) -> RouteScheduler:
+    """Return the scheduler of the routes using client."""
+    schedulers: dict[tuple, RouteScheduler] = hass.data[DOMAIN].setdefault(DATA_SCHEDULERS, {})
+    scheduler = schedulers.get(client.key)
+    if scheduler is None:
+        scheduler = schedulers[client.key] = RouteScheduler(hass, client)
+    return scheduler
+
+
+@callback
+def async_remove_from_scheduler(hass: HomeAssistant, client: SncfApiClient, coordinator) -> None:
+    """Stop scheduling a coordinator and drop the scheduler once unused."""
+    schedulers: dict[tuple, RouteScheduler] = hass.data[DOMAIN].get(DATA_SCHEDULERS, {})
+    scheduler = schedulers.get(client.key)
+    if scheduler is None:
+        return
+
+    scheduler.async_remove(coordinator)
+    if scheduler.empty:
+        schedulers.pop(client.key)
@@ -5,6 +5,9 @@ from datetime import datetime
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.entity import EntityCategory
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from homeassistant.util import dt as dt_util
 from homeassistant.components.sensor import (
     SensorEntity,
     SensorDeviceClass,
@@ -14,22 +17,12 @@ from homeassistant.components.sensor import (
 from .const import (
     DOMAIN, 
     CONF_NEXT_JOURNEY, 
-    CONF_LAST_JOURNEY,
-    ATTR_JOURNEYS_LIST, 
-    ATTR_LINE_JOURNEY, 
-    ATTR_DIRECTION_JOURNEY, 
-    ATTR_DEPARTURE_JOURNEY, 
-    ATTR_ARRIVAL_JOURNEY, 
-    ATTR_DEPARTURE_TIME_JOURNEY, 
-    ATTR_ARRIVAL_TIME_JOURNEY, 
-    ATTR_DURATION_JOURNEY, 
-    ATTR_PHYSICAL_MODE_JOURNEY, 
-    ATTR_DELAY_JOURNEY,
-    ATTR_DISRUPTIONS_LIST,
-    ATTR_DISRUPTION_TYPE,
-    ATTR_DISRUPTION_MESSAGE
+    CONF_CONNECTION,
+    DATA_METRICS,
+    ATTR_JOURNEYS_LIST
 )
-from .journey_entity import JourneyBaseEntity
+from .journey_entity import JourneyBaseEntity, JourneyEntityManager, route_device_info, route_unique_id
+from .routes import routes_data, route_coordinators
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -41,15 +34,25 @@ async def async_setup_entry(
 
     _LOGGER.debug("Calling async_setup_entry entry=%s", entry)
 
-    next_journey_coordinator = hass.data[DOMAIN][entry.entry_id][CONF_NEXT_JOURNEY]
-    entities = [entity(next_journey_coordinator, index, "next") for index, ent in enumerate(next_journey_coordinator.data.journeys) for entity in (NextJourneyEntity, DepartureEntity, ArrivalEntity, DurationEntity, DelayEntity)]
-    entities.extend([JourneyEntity(next_journey_coordinator, 0, "next")])
+    def journey_entities(coordinator, index, type):
+        entities = [entity(coordinator, index, type) for entity in (NextJourneyEntity, DepartureEntity, ArrivalEntity, DurationEntity, DelayEntity, CountdownEntity)]
+        if type == "next" and index == 0:
+            entities.append(JourneyEntity(coordinator, index, type))
+        return entities
 
-    if CONF_LAST_JOURNEY in hass.data[DOMAIN][entry.entry_id]:
-        last_journey_coordinator = hass.data[DOMAIN][entry.entry_id][CONF_LAST_JOURNEY]
-        entities.extend([entity(last_journey_coordinator, index, "last") for index, ent in enumerate(last_journey_coordinator.data.journeys) for entity in (NextJourneyEntity, DepartureEntity, ArrivalEntity, DurationEntity, DelayEntity)])
+    for route in routes_data(hass.data[DOMAIN][entry.entry_id]):
+        for coordinator in route_coordinators(route):
+            JourneyEntityManager(coordinator, "last" if coordinator.last_journey else "next", journey_entities, async_add_entities).async_setup(entry)
 
-    async_add_entities(entities, True)
+        next_journey_coordinator = route[CONF_NEXT_JOURNEY]
+        entities = [
+            RouteRequestsEntity(next_journey_coordinator, route[DATA_METRICS]),
+            UpdateTimeEntity(next_journey_coordinator, route[DATA_METRICS])
+        ]
+        # The routes of a multi-route entry share their connection, its usage is in the diagnostics of the entry
+        if next_journey_coordinator.route_id is None:
+            entities.append(ConnectionRequestsEntity(next_journey_coordinator, route[CONF_CONNECTION].metrics))
+        async_add_entities(entities)
 
 
 
@@ -58,11 +61,11 @@ class NextJourneyEntity(JourneyBaseEntity, SensorEntity):
         super().__init__(coordinator, index, type)
 
         self._attr_unique_id = f"{self.short_start_name()}_{self.short_end_name()}_{self.type}_journey_{self.index + 1}"
-        self._attr_native_value = self.timezone.localize(self.data.journey.departure_date_time)
+        self._attr_native_value = self.departure_time
 
     def _handle_journey_update(self) -> None:
         _LOGGER.debug("[%s] updating: %s - %s", type(self).__name__, self.start_label, self.end_label)
-        self._attr_native_value = self.timezone.localize(self.data.journey.departure_date_time)
+        self._attr_native_value = self.departure_time
         self.async_write_ha_state()
 
     @property
@@ -71,27 +74,25 @@ class NextJourneyEntity(JourneyBaseEntity, SensorEntity):
     
     @property
     def extra_state_attributes(self):
-        return {
-            ATTR_LINE_JOURNEY: self.data.journey.sections[0].informations.label,
-            ATTR_DIRECTION_JOURNEY: self.data.journey.sections[0].informations.direction,
-            ATTR_DEPARTURE_TIME_JOURNEY: self.timezone.localize(self.data.journey.departure_date_time),
-            ATTR_ARRIVAL_TIME_JOURNEY: self.timezone.localize(self.data.journey.arrival_date_time),
-            ATTR_DURATION_JOURNEY: self.data.journey.sections[0].duration,
-            ATTR_PHYSICAL_MODE_JOURNEY: self.data.journey.sections[0].informations.physical_mode,
-            ATTR_DEPARTURE_JOURNEY: self.start_label,
-            ATTR_ARRIVAL_JOURNEY: self.end_label
-        }
+        return self.coordinator.attributes.journeys[self.index]
     
 
 class JourneyEntity(JourneyBaseEntity, SensorEntity):
+    # The list of journeys is refreshed often and is not useful in the history
+    _unrecorded_attributes = frozenset({ATTR_JOURNEYS_LIST})
+
     def __init__(self, coordinator, index, type):
         super().__init__(coordinator, index, type)
         self._attr_unique_id = f"{self.short_start_name()}_{self.short_end_name()}_journeys"
-        self._attr_native_value = self.timezone.localize(self.data.journey.departure_date_time)
+        self._attr_native_value = self.departure_time
+
+    def journey_changed(self) -> bool:
+        # Attributes list every journey
+        return len(self.coordinator.changed_journeys) > 0
 
     def _handle_journey_update(self) -> None:
         _LOGGER.debug("[%s] updating: %s - %s", type(self).__name__, self.start_label, self.end_label)
-        self._attr_native_value = self.timezone.localize(self.data.journey.departure_date_time)
+        self._attr_native_value = self.departure_time
         self.async_write_ha_state()
 
     @property
@@ -100,32 +101,7 @@ class JourneyEntity(JourneyBaseEntity, SensorEntity):
 
     @property
     def extra_state_attributes(self):
-        journeys = []
-        for data in self.coordinator.data.journeys:
-            
-            disruptions = []
-            for disruption in data.disruptions:
-                disruptions.append({
-                    ATTR_DISRUPTION_TYPE: disruption.severity_effect,
-                    ATTR_DISRUPTION_MESSAGE: disruption.messages[0],
-                    
-                }) 
-            journeys.append({
-                ATTR_LINE_JOURNEY: data.journey.sections[0].informations.label,
-                ATTR_DIRECTION_JOURNEY: data.journey.sections[0].informations.direction,
-                ATTR_DEPARTURE_TIME_JOURNEY: self.timezone.localize(data.journey.departure_date_time),
-                ATTR_ARRIVAL_TIME_JOURNEY: self.timezone.localize(data.journey.arrival_date_time),
-                ATTR_DURATION_JOURNEY: data.journey.sections[0].duration,
-                ATTR_PHYSICAL_MODE_JOURNEY: data.journey.sections[0].informations.physical_mode,
-                ATTR_DEPARTURE_JOURNEY: self.start_label,
-                ATTR_ARRIVAL_JOURNEY: self.end_label,
-                ATTR_DISRUPTIONS_LIST: disruptions,
-                ATTR_DELAY_JOURNEY: self.get_delay(data.disruptions, self.start_label)
-            })
-
-        return {
-            ATTR_JOURNEYS_LIST: journeys
-        }
+        return self.coordinator.attributes.payload
     
 
 class DepartureEntity(JourneyBaseEntity, SensorEntity):
@@ -134,11 +110,11 @@ class DepartureEntity(JourneyBaseEntity, SensorEntity):
         super().__init__(coordinator, index, type)
 
         self._attr_unique_id = f"{self.short_start_name()}_{self.short_end_name()}_{self.type}_journey_departure_{self.index + 1}"
-        self._attr_native_value = self.timezone.localize(self.data.journey.departure_date_time)
+        self._attr_native_value = self.departure_time
 
     def _handle_journey_update(self) -> None:
         _LOGGER.debug("[%s] updating: %s - %s", type(self).__name__, self.start_label, self.end_label)
-        self._attr_native_value = self.timezone.localize(self.data.journey.departure_date_time)
+        self._attr_native_value = self.departure_time
         self.async_write_ha_state()
 
     @property
@@ -152,11 +128,11 @@ class ArrivalEntity(JourneyBaseEntity, SensorEntity):
         super().__init__(coordinator, index, type)
 
         self._attr_unique_id = f"{self.short_start_name()}_{self.short_end_name()}_{self.type}_journey_arrival_{self.index + 1}"
-        self._attr_native_value = self.timezone.localize(self.data.journey.arrival_date_time)
+        self._attr_native_value = self.arrival_time
 
     def  _handle_journey_update(self) -> None:
         _LOGGER.debug("[%s] updating: %s - %s", type(self).__name__, self.start_label, self.end_label)
-        self._attr_native_value = self.timezone.localize(self.data.journey.arrival_date_time)
+        self._attr_native_value = self.arrival_time
         self.async_write_ha_state()
 
     @property
@@ -170,11 +146,11 @@ class DurationEntity(JourneyBaseEntity, SensorEntity):
 
         self._attr_native_unit_of_measurement = "s"
         self._attr_unique_id = f"{self.short_start_name()}_{self.short_end_name()}_{self.type}_journey_duration_{self.index + 1}"
-        self._attr_native_value = self.data.journey.sections[0].duration
+        self._attr_native_value = self.data.duration
 
     def _handle_journey_update(self) -> None:
         _LOGGER.debug("[%s] updating: %s - %s", type(self).__name__, self.start_label, self.end_label)
-        self._attr_native_value = self.data.journey.sections[0].duration
+        self._attr_native_value = self.data.duration
         self.async_write_ha_state()
 
     @property
@@ -193,11 +169,11 @@ class DelayEntity(JourneyBaseEntity, SensorEntity):
 
         self._attr_native_unit_of_measurement = "s"
         self._attr_unique_id = f"{self.short_start_name()}_{self.short_end_name()}_{self.type}_journey_disruption_delay_{self.index + 1}"
-        self._attr_native_value = self.get_delay(self.data.disruptions, self.start_label)
+        self._attr_native_value = self.data.delay
 
     def _handle_journey_update(self) -> None:
         _LOGGER.debug("[%s] updating: %s - %s", type(self).__name__, self.start_label, self.end_label)
-        self._attr_native_value = self.get_delay(self.data.disruptions, self.start_label)
+        self._attr_native_value = self.data.delay
         self.async_write_ha_state()
 
     @property
@@ -207,4 +183,104 @@ class DelayEntity(JourneyBaseEntity, SensorEntity):
     @property
     def state_class(self) -> SensorStateClass:
         return SensorStateClass.MEASUREMENT
-    
+
+
+class CountdownEntity(JourneyBaseEntity, SensorEntity):
+    def __init__(self, coordinator, index, type):
+        super().__init__(coordinator, index, type)
+
+        self._attr_native_unit_of_measurement = "min"
+        self._attr_unique_id = f"{self.short_start_name()}_{self.short_end_name()}_{self.type}_journey_countdown_{self.index + 1}"
+        self._attr_native_value = self.minutes_until_departure()
+
+    def journey_changed(self) -> bool:
+        # Updated every minute by the coordinator, an unavailable countdown has nothing to write
+        return self.available
+
+    def minutes_until_departure(self) -> int:
+        return max(int((self.departure_time - dt_util.utcnow()).total_seconds() // 60), 0)
+
+    def _handle_journey_update(self) -> None:
+        self._attr_native_value = self.minutes_until_departure()
+        self.async_write_ha_state()
+
+    @property
+    def device_class(self) -> SensorDeviceClass | None:
+        return SensorDeviceClass.DURATION
+
+
+class MetricsEntity(CoordinatorEntity, SensorEntity):
+    """Diagnostic sensor of the API usage, updated with the journeys of the route."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+    # Counters and histogram change with every request, the state is enough for the history
+    _unrecorded_attributes = frozenset({
+        "requests", "failures", "bytes", "average_latency", "latency_histogram", "cache_hits", "cache_misses",
+        "joined_requests", "updates", "update_failures", "average_update_time", "last_update_time"
+    })
+    key = None
+
+    def __init__(self, coordinator, metrics):
+        super().__init__(coordinator)
+        self.metrics = metrics
+
+        start_label = self.coordinator.data.start.label
+        end_label = self.coordinator.data.end.label
+        self._attr_unique_id = route_unique_id(self.coordinator, f"{start_label.replace(' ', '')[0:3].lower()}_{end_label.replace(' ', '')[0:3].lower()}_{self.key}")
+        self._attr_native_value = self.metrics_value()
+        self._attributes = self.metrics.as_dict()
+
+    def metrics_value(self):
+        return self.metrics.requests
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        # Coordinators update their listeners every minute, metrics only change with a refresh
+        value = self.metrics_value()
+        attributes = self.metrics.as_dict()
+        if value == self._attr_native_value and attributes == self._attributes:
+            return
+
+        self._attr_native_value = value
+        self._attributes = attributes
+        self.async_write_ha_state()
+
+    @property
+    def available(self) -> bool:
+        # Metrics are still meaningful when the API fails
+        return True
+
+    @property
+    def device_info(self):
+        return route_device_info(self.coordinator)
+
+    @property
+    def extra_state_attributes(self):
+        return self._attributes
+
+
+class RouteRequestsEntity(MetricsEntity):
+    """API requests sent to refresh the journeys of this route."""
+
+    key = "api_requests"
+
+
+class ConnectionRequestsEntity(MetricsEntity):
+    """API requests sent with the API key of this route, for every route."""
+
+    key = "connection_api_requests"
+
+
+class UpdateTimeEntity(MetricsEntity):
+    """Time spent refreshing the journeys of this route."""
+
+    _attr_native_unit_of_measurement = "s"
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    key = "update_time"
+
+    def metrics_value(self):
+        if self.metrics.last_update_time is None:
+            return None
+        return round(self.metrics.last_update_time, 3)
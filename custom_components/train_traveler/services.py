@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import date, datetime, time, timedelta, tzinfo
+
+from .const import TIMETABLE_PAGE_SIZE
+from .timetable import DailyTimetable, timetable_journey
+from .snapshot import RouteSnapshot, route_snapshot
+from .disruptions import DisruptionFeed
+from .repositories import (
+    SharedJourneyRepository,
+    SharedStopAreaRepository,
+    SharedDisruptionRepository
+)
+
+from sncf.entities.journey_entity import JourneyEntity
+from sncf.entities.line_entity import LineEntity
+
+from sncf.models.next_journey_model import NextJourney
+from sncf.models.area_model import Area
+from sncf.models.journey_model import Journey
+
+
+class AsyncJourneyService(object):
+    """Asyncio counterpart of sncf's JourneyService.
+
+    Lines of a route are queried concurrently and no executor thread is used.
+    """
+
+    def __init__(self,
+                 stop_area_repository: SharedStopAreaRepository,
+                 journey_repository: SharedJourneyRepository,
+                 disruption_repository: SharedDisruptionRepository,
+                 disruption_feed: DisruptionFeed | None = None
+                 ):
+        self.stop_area_repository = stop_area_repository
+        self.journey_repository = journey_repository
+        self.disruption_repository = disruption_repository
+        self.disruption_feed = disruption_feed
+
+    async def async_get_common_lines_between_areas(self, start_area_id: str, end_area_id: str) -> list[LineEntity]:
+        try:
+            lines_in_start_area, lines_in_end_area = await asyncio.gather(
+                self.stop_area_repository.async_find_lines_by_stop_area_id(start_area_id),
+                self.stop_area_repository.async_find_lines_by_stop_area_id(end_area_id)
+            )
+        except Exception:
+            raise Exception("Error: Impossible to find lines from area id '{start_id}' and '{end_id}'".format(start_id=start_area_id, end_id=end_area_id))
+
+        end_lines_ids = {line.id for line in lines_in_end_area}
+        return [line for line in lines_in_start_area if line.id in end_lines_ids]
+
+    async def async_get_line_stop_points(self, start_area: Area, end_area: Area, line: LineEntity) -> tuple:
+        return await asyncio.gather(
+            self.stop_area_repository.async_find_area_stop_point_by_line_id(start_area.id, line.id),
+            self.stop_area_repository.async_find_area_stop_point_by_line_id(end_area.id, line.id)
+        )
+
+    async def async_get_journeys_from_entities(self, journeys_entities: list[JourneyEntity], journeys_lines=None) -> list[Journey]:
+        """Attach their disruptions to journeys, journeys_lines being the id of the line of each journey when known."""
+        if self.disruption_feed is not None:
+            disruptions = await self.disruption_feed.async_get_journeys_disruptions(
+                journeys_entities,
+                journeys_lines if journeys_lines is not None else [None] * len(journeys_entities)
+            )
+            return [Journey(journey, journey_disruptions) for journey, journey_disruptions in zip(journeys_entities, disruptions)]
+
+        disruptions = await asyncio.gather(*[
+            asyncio.gather(*[
+                self.disruption_repository.async_find_disruption_by_id(disruption_id)
+                for section in journey.sections
+                for disruption_id in section.informations.disruptions_ids
+            ])
+            for journey in journeys_entities
+        ])
+
+        return [Journey(journey, list(journey_disruptions)) for journey, journey_disruptions in zip(journeys_entities, disruptions)]
+
+    async def async_get_direct_journeys(self, start_area: Area, end_area: Area, count=0) -> NextJourney:
+        lines = await self.async_get_common_lines_between_areas(start_area.id, end_area.id)
+
+        async def async_get_line_journeys(line: LineEntity) -> list[JourneyEntity]:
+            start_stop_point, end_stop_point = await self.async_get_line_stop_points(start_area, end_area, line)
+            return await self.journey_repository.async_find_journeys(
+                start_stop_point.id,
+                end_stop_point.id,
+                allowed_id=[line.id],
+                max_nb_transfers=0,
+                count=count,
+                data_freshness="realtime"
+            )
+
+        # Journeys are fetched line by line, the line of each journey gives the disruption feed to look into
+        lines_journeys: list[tuple[JourneyEntity, str]] = [
+            (journey, line.id)
+            for line, line_journeys in zip(lines, await asyncio.gather(*[async_get_line_journeys(line) for line in lines]))
+            for journey in line_journeys
+        ]
+
+        lines_journeys.sort(key=lambda x: x[0].departure_date_time)
+        lines_journeys = lines_journeys[0:count]
+
+        return NextJourney(
+            start_area,
+            end_area,
+            await self.async_get_journeys_from_entities(
+                [journey for journey, _ in lines_journeys],
+                [line_id for _, line_id in lines_journeys]
+            )
+        )
+
+    async def async_get_journeys(self, start_area: Area, end_area: Area, count=0, max_transfers=0) -> NextJourney:
+        """Fetch the next journeys of a route with up to max_transfers connections.
+
+        Direct journeys are fetched line by line. Journeys with connections
+        are fetched with a single request between the stop areas, whatever
+        their number of legs.
+        """
+        if max_transfers == 0:
+            return await self.async_get_direct_journeys(start_area, end_area, count)
+
+        journeys = await self.journey_repository.async_find_journeys(
+            start_area.id,
+            end_area.id,
+            max_nb_transfers=max_transfers,
+            count=count,
+            data_freshness="realtime"
+        )
+        # Journeys walking all the way have no public transport section
+        journeys = sorted((journey for journey in journeys if journey.sections), key=lambda x: x.departure_date_time)[0:count]
+
+        return NextJourney(start_area, end_area, await self.async_get_journeys_from_entities(journeys))
+
+    async def _async_get_day_journeys(self, start_id: str, end_id: str, day: date, **kwargs) -> list[JourneyEntity]:
+        """Page through the journeys of the base schedule leaving on day."""
+        day_journeys: list[JourneyEntity] = []
+        departure = datetime.combine(day, time.min)
+        while True:
+            page = await self.journey_repository.async_find_journeys(
+                start_id,
+                end_id,
+                count=TIMETABLE_PAGE_SIZE,
+                datetime=departure,
+                datetime_represents="departure",
+                data_freshness="base_schedule",
+                **kwargs
+            )
+            page = [journey for journey in page if journey.sections and journey.departure_date_time >= departure]
+            if len(page) == 0:
+                return day_journeys
+
+            day_journeys.extend(journey for journey in page if journey.departure_date_time.date() == day)
+            if page[-1].departure_date_time.date() != day:
+                return day_journeys
+
+            departure = page[-1].departure_date_time + timedelta(seconds=1)
+
+    async def async_get_daily_timetable(self, start_area: Area, end_area: Area, day: date, timezone: tzinfo, max_transfers=0) -> DailyTimetable:
+        """Fetch every journey of the base schedule leaving on day, direct ones line by line.
+
+        Only a snapshot of each journey is kept, with what finding its
+        realtime version takes.
+        """
+        if max_transfers > 0:
+            return DailyTimetable(day, [
+                timetable_journey(journey, timezone)
+                for journey in await self._async_get_day_journeys(start_area.id, end_area.id, day, max_nb_transfers=max_transfers)
+            ])
+
+        lines = await self.async_get_common_lines_between_areas(start_area.id, end_area.id)
+
+        async def async_get_line_day_journeys(line: LineEntity) -> list[JourneyEntity]:
+            start_stop_point, end_stop_point = await self.async_get_line_stop_points(start_area, end_area, line)
+            return await self._async_get_day_journeys(start_stop_point.id, end_stop_point.id, day, allowed_id=[line.id], max_nb_transfers=0)
+
+        return DailyTimetable(day, [
+            timetable_journey(journey, timezone, line.id)
+            for line, line_journeys in zip(lines, await asyncio.gather(*[async_get_line_day_journeys(line) for line in lines]))
+            for journey in line_journeys
+        ])
+
+    async def async_get_last_direct_journey_from_timetable(
+            self, start_area: Area, end_area: Area, timetable: DailyTimetable, timezone: tzinfo, max_transfers=0
+    ) -> RouteSnapshot:
+        """Return the last journey of a timetable with its realtime disruptions.
+
+        Only the realtime version of that journey is queried, to get its disruptions.
+        """
+        last_journey = timetable.last()
+        if last_journey is None:
+            return RouteSnapshot(start_area, end_area, ())
+
+        realtime_journey = None
+        if last_journey.start_id is not None and last_journey.end_id is not None:
+            realtime_journeys = await self.journey_repository.async_find_journeys(
+                last_journey.start_id,
+                last_journey.end_id,
+                max_nb_transfers=max_transfers,
+                count=2,
+                datetime=last_journey.departure,
+                datetime_represents="departure",
+                data_freshness="realtime"
+            )
+            realtime_journey = next((
+                journey for journey in realtime_journeys
+                if journey.sections and journey.sections[0].informations.trip_short_name == last_journey.trip
+            ), None)
+
+        # Keep the base schedule journey when the train is not found (cancelled for instance)
+        if realtime_journey is None:
+            return RouteSnapshot(start_area, end_area, (last_journey.snapshot,))
+
+        return route_snapshot(NextJourney(
+            start_area,
+            end_area,
+            await self.async_get_journeys_from_entities([realtime_journey], [last_journey.line_id])
+        ), timezone)
@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+from collections.abc import Mapping
+from dataclasses import dataclass, replace
+from datetime import datetime, tzinfo
+
+from sncf.models.area_model import Area
+from sncf.models.journey_model import Journey
+from sncf.models.next_journey_model import NextJourney
+
+from .const import DELAY_DISRUPTION_EFFECT
+
+
+def stop_delay(base: datetime | None, amended: datetime | None) -> float | None:
+    """Delay in seconds between two times of day, they may be on both sides of midnight."""
+    if base is None or amended is None:
+        return None
+    delay = (amended - base).total_seconds()
+    if delay < -43200:
+        delay += 86400
+    elif delay > 43200:
+        delay -= 86400
+    return delay
+
+
+def disruption_delays(disruption) -> dict[str, tuple[float | None, float | None]]:
+    """Index the departure and arrival delays announced by a disruption by stop point id.
+
+    Only delay disruptions announce delays, a cancelled train has none.
+    """
+    delays = {}
+    if disruption.severity_effect != DELAY_DISRUPTION_EFFECT:
+        return delays
+    for impacted_object in disruption.impacted_objects:
+        for impacted_stop in impacted_object.impacted_stops:
+            if impacted_stop.stop_point is None:
+                continue
+            delays[impacted_stop.stop_point.id] = (
+                stop_delay(impacted_stop.base_departure_time, impacted_stop.ammended_departure_time),
+                stop_delay(impacted_stop.base_arrival_time, impacted_stop.amended_arrival_time)
+            )
+    return delays
+
+
+def worst_delay(delays: list[float | None]) -> float | None:
+    delays = [delay for delay in delays if delay is not None]
+    return max(delays) if delays else None
+
+
+@dataclass(frozen=True, slots=True)
+class DisruptionSnapshot:
+    id: str
+    effect: str
+    message: str | None
+
+
+@dataclass(frozen=True, slots=True)
+class PushedDisruption:
+    """A disruption pushed to the integration instead of being fetched from the API.
+
+    It applies to the legs of the train trip, its short name (the train
+    number), and replaces a fetched disruption with the same id. A cleared
+    disruption removes the fetched one.
+    """
+
+    id: str
+    trip: str | None
+    effect: str
+    message: str | None
+    delay: float | None
+    arrival_delay: float | None
+    cleared: bool
+    received_at: datetime
+
+
+@dataclass(frozen=True, slots=True)
+class LegSnapshot:
+    """A train of a journey, from the station it is boarded to the one it is left."""
+
+    departure: datetime
+    arrival: datetime
+    start: str | None
+    end: str | None
+    line: str
+    direction: str
+    mode: str
+    delay: float | None
+    arrival_delay: float | None
+    # Short name of the train trip, pushed disruptions are matched on it
+    trip: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class JourneySnapshot:
+    """What the entities show of a journey.
+
+    Departure and arrival are timezone aware, delays are in seconds and
+    None when no disruption announces one. Line, direction and mode are the
+    ones of the first leg, duration is the one of the whole journey. Two
+    snapshots are equal when the entities of the journey show the same thing.
+    """
+
+    departure: datetime
+    arrival: datetime
+    duration: int
+    line: str
+    direction: str
+    mode: str
+    delay: float | None
+    arrival_delay: float | None
+    disruptions: tuple[DisruptionSnapshot, ...]
+    legs: tuple[LegSnapshot, ...]
+
+    @property
+    def disrupted(self) -> bool:
+        return len(self.disruptions) > 0
+
+    @property
+    def transfers(self) -> int:
+        return max(len(self.legs) - 1, 0)
+
+    @property
+    def transfer_slack(self) -> float | None:
+        """Shortest time in seconds to change trains, negative when a connection is missed."""
+        if len(self.legs) < 2:
+            return None
+        return min(
+            (following.departure - previous.arrival).total_seconds()
+            for previous, following in zip(self.legs, self.legs[1:])
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class RouteSnapshot:
+    """Journeys of a route, the data of its coordinators."""
+
+    start: Area
+    end: Area
+    journeys: tuple[JourneySnapshot, ...]
+
+    def sliced(self, count: int) -> RouteSnapshot:
+        if len(self.journeys) <= count:
+            return self
+        return RouteSnapshot(self.start, self.end, self.journeys[:count])
+
+
+def journey_with_pushed_disruptions(data: JourneySnapshot, pushed: Mapping[str, PushedDisruption]) -> JourneySnapshot:
+    """Apply the pushed disruptions of the trips of a journey, or of its fetched disruptions.
+
+    Delays pushed for a trip replace the fetched ones of its legs, and a
+    journey left without disruption has no delay anymore.
+    """
+    trips = {leg.trip for leg in data.legs if leg.trip is not None}
+    fetched = {disruption.id for disruption in data.disruptions}
+    matching = [disruption for disruption in pushed.values() if disruption.trip in trips or disruption.id in fetched]
+    if not matching:
+        return data
+
+    # Pushed disruptions are the most recent ones, they come first
+    disruptions = tuple(
+        DisruptionSnapshot(disruption.id, disruption.effect, disruption.message)
+        for disruption in matching if not disruption.cleared
+    ) + tuple(disruption for disruption in data.disruptions if disruption.id not in pushed)
+
+    legs = []
+    for leg in data.legs:
+        leg_pushed = [disruption for disruption in matching if not disruption.cleared and disruption.trip == leg.trip]
+        if not disruptions:
+            leg = replace(leg, delay=None, arrival_delay=None)
+        elif leg_pushed:
+            delay = worst_delay([disruption.delay for disruption in leg_pushed])
+            arrival_delay = worst_delay([disruption.arrival_delay for disruption in leg_pushed])
+            leg = replace(
+                leg,
+                delay=leg.delay if delay is None else delay,
+                arrival_delay=leg.arrival_delay if arrival_delay is None else arrival_delay
+            )
+        legs.append(leg)
+
+    return replace(
+        data,
+        delay=legs[0].delay,
+        arrival_delay=legs[-1].arrival_delay,
+        disruptions=disruptions,
+        legs=tuple(legs)
+    )
+
+
+def route_with_pushed_disruptions(journeys: RouteSnapshot, pushed: Mapping[str, PushedDisruption]) -> RouteSnapshot:
+    if not pushed:
+        return journeys
+    return RouteSnapshot(
+        journeys.start,
+        journeys.end,
+        tuple(journey_with_pushed_disruptions(data, pushed) for data in journeys.journeys)
+    )
+
+
+def leg_snapshot(section, disruptions: list, timezone: tzinfo, delays_index: dict[str, dict]) -> LegSnapshot:
+    """Build the snapshot of a public transport section of a journey.
+
+    Delays are the worst ones announced by the disruptions of the journey at
+    the stop points the section starts and ends at.
+    """
+    departure_delays = []
+    arrival_delays = []
+    for disruption in disruptions:
+        if disruption.id not in delays_index:
+            delays_index[disruption.id] = disruption_delays(disruption)
+        if section.start is not None and section.start.id in delays_index[disruption.id]:
+            departure_delays.append(delays_index[disruption.id][section.start.id][0])
+        if section.end is not None and section.end.id in delays_index[disruption.id]:
+            arrival_delays.append(delays_index[disruption.id][section.end.id][1])
+
+    return LegSnapshot(
+        departure=section.departure_date_time.replace(tzinfo=timezone),
+        arrival=section.arrival_date_time.replace(tzinfo=timezone),
+        start=section.start.name if section.start is not None else None,
+        end=section.end.name if section.end is not None else None,
+        line=section.informations.label,
+        direction=section.informations.direction,
+        mode=section.informations.physical_mode,
+        delay=worst_delay(departure_delays),
+        arrival_delay=worst_delay(arrival_delays),
+        trip=section.informations.trip_short_name
+    )
+
+
+def journey_snapshot(data: Journey, timezone: tzinfo, delays_index: dict[str, dict]) -> JourneySnapshot:
+    """Build the snapshot of a journey fetched with the sncf library.
+
+    Everything is computed from the sections of the journey, legs do not
+    cost any request. Each disruption is indexed once in delays_index.
+    """
+    legs = tuple(leg_snapshot(section, data.disruptions, timezone, delays_index) for section in data.journey.sections)
+
+    return JourneySnapshot(
+        departure=data.journey.departure_date_time.replace(tzinfo=timezone),
+        arrival=data.journey.arrival_date_time.replace(tzinfo=timezone),
+        duration=data.journey.duration,
+        line=legs[0].line,
+        direction=legs[0].direction,
+        mode=legs[0].mode,
+        delay=legs[0].delay,
+        arrival_delay=legs[-1].arrival_delay,
+        disruptions=tuple(
+            DisruptionSnapshot(
+                disruption.id,
+                disruption.severity_effect,
+                disruption.messages[0] if disruption.messages else None
+            )
+            for disruption in data.disruptions
+        ),
+        legs=legs
+    )
+
+
+def route_snapshot(journeys: NextJourney, timezone: tzinfo) -> RouteSnapshot:
+    """Build the snapshot of journeys fetched with the sncf library, which can be dropped afterwards."""
+    # Disruptions are often shared by several journeys
+    delays_index: dict[str, dict] = {}
+    return RouteSnapshot(
+        journeys.start,
+        journeys.end,
+        tuple(journey_snapshot(data, timezone, delays_index) for data in journeys.journeys)
+    )
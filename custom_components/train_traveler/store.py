@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+from datetime import datetime
+import hashlib
+from typing import Any
+
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+from .snapshot import DisruptionSnapshot, LegSnapshot, JourneySnapshot, RouteSnapshot
+
+from sncf.models.area_model import Area
+
+STORAGE_VERSION = 2
+QUOTA_STORAGE_VERSION = 1
+
+
+class FlushableStore(Store):
+    async def async_flush(self) -> None:
+        """Write the data of a pending delayed save right away."""
+        await self._async_handle_write_data()
+
+
+class JourneysStore(FlushableStore):
+    """Storage of the last journeys fetched for a route."""
+
+    async def _async_migrate_func(self, old_major_version: int, old_minor_version: int, old_data: dict) -> Any:
+        # Journeys stored by an older version are dropped, they are fetched again
+        return None
+
+
+class QuotaStore(FlushableStore):
+    """Storage of the requests sent today with an API key, so restarts do not reset its daily quota."""
+
+
+def storage_key(entry_id: str, last_journey: bool, reverse: bool = False) -> str:
+    return f"{DOMAIN}.{entry_id}.{'return_' if reverse else ''}{'last' if last_journey else 'next'}_journey"
+
+
+def quota_storage_key(client_key: tuple) -> str:
+    # The API key is not written in the name of the file
+    return f"{DOMAIN}.quota.{hashlib.sha256(repr(client_key).encode()).hexdigest()[:16]}"
+
+
+def dump_area(area: Area) -> dict:
+    return {"id": area.id, "name": area.name, "label": area.label, "coord": area.coord}
+
+
+def load_area(value: dict) -> Area:
+    return Area(value["id"], value["name"], value["label"], value["coord"])
+
+
+def dump_leg(leg: LegSnapshot) -> dict:
+    return {
+        "departure": leg.departure.isoformat(),
+        "arrival": leg.arrival.isoformat(),
+        "start": leg.start,
+        "end": leg.end,
+        "line": leg.line,
+        "direction": leg.direction,
+        "mode": leg.mode,
+        "delay": leg.delay,
+        "arrival_delay": leg.arrival_delay,
+        "trip": leg.trip
+    }
+
+
+def load_leg(value: dict) -> LegSnapshot:
+    return LegSnapshot(**{
+        **value,
+        "departure": datetime.fromisoformat(value["departure"]),
+        "arrival": datetime.fromisoformat(value["arrival"])
+    })
+
+
+def dump_journeys(journeys: RouteSnapshot) -> dict:
+    """Convert the snapshot of a route to JSON serializable data."""
+    return {
+        "start": dump_area(journeys.start),
+        "end": dump_area(journeys.end),
+        "journeys": [
+            {
+                "departure": data.departure.isoformat(),
+                "arrival": data.arrival.isoformat(),
+                "duration": data.duration,
+                "line": data.line,
+                "direction": data.direction,
+                "mode": data.mode,
+                "delay": data.delay,
+                "arrival_delay": data.arrival_delay,
+                "disruptions": [[disruption.id, disruption.effect, disruption.message] for disruption in data.disruptions],
+                "legs": [dump_leg(leg) for leg in data.legs]
+            }
+            for data in journeys.journeys
+        ]
+    }
+
+
+def load_journeys(value: dict) -> RouteSnapshot:
+    """Rebuild the snapshot of a route dumped with dump_journeys."""
+    return RouteSnapshot(
+        load_area(value["start"]),
+        load_area(value["end"]),
+        tuple(
+            JourneySnapshot(
+                departure=datetime.fromisoformat(data["departure"]),
+                arrival=datetime.fromisoformat(data["arrival"]),
+                duration=data["duration"],
+                line=data["line"],
+                direction=data["direction"],
+                mode=data["mode"],
+                delay=data["delay"],
+                arrival_delay=data["arrival_delay"],
+                disruptions=tuple(DisruptionSnapshot(*disruption) for disruption in data["disruptions"]),
+                legs=tuple(load_leg(leg) for leg in data["legs"])
+            )
+            for data in value["journeys"]
+        )
+    )
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import date, datetime, tzinfo
+
+from sncf.entities.journey_entity import JourneyEntity
+from sncf.models.journey_model import Journey
+
+from .snapshot import JourneySnapshot, journey_snapshot
+
+
+@dataclass(frozen=True, slots=True)
+class TimetableJourney:
+    """A journey of the base schedule, with what finding its realtime version takes."""
+
+    # Naive, local to the start stop area, as sent by the API
+    departure: datetime
+    start_id: str | None
+    end_id: str | None
+    trip: str | None
+    line_id: str | None
+    snapshot: JourneySnapshot
+
+
+def timetable_journey(journey: JourneyEntity, timezone: tzinfo, line_id: str | None = None) -> TimetableJourney:
+    """Keep what the timetable needs of a journey fetched with the sncf library, which can be dropped afterwards."""
+    first_section = journey.sections[0]
+    last_section = journey.sections[-1]
+    return TimetableJourney(
+        departure=journey.departure_date_time,
+        start_id=first_section.start.id if first_section.start is not None else None,
+        end_id=last_section.end.id if last_section.end is not None else None,
+        trip=first_section.informations.trip_short_name,
+        line_id=line_id,
+        snapshot=journey_snapshot(Journey(journey, []), timezone, {})
+    )
+
+
+class DailyTimetable(object):
+    """Journeys of a route for one day, sorted by departure.
+
+    Departures are kept in a separate sorted list so lookups are binary
+    searches instead of API calls.
+    """
+
+    __slots__ = ("day", "departures", "journeys")
+
+    def __init__(self, day: date, journeys: list[TimetableJourney]):
+        self.day = day
+        self.journeys = sorted(journeys, key=lambda journey: journey.departure)
+        self.departures = [journey.departure for journey in self.journeys]
+
+    def __len__(self) -> int:
+        return len(self.journeys)
+
+    def last(self) -> TimetableJourney | None:
+        """Return the last journey of the day."""
+        return self.journeys[-1] if self.journeys else None
+
+    def next(self, after: datetime, count: int = 1) -> list[TimetableJourney]:
+        """Return the count journeys leaving at or after a (naive, local) datetime."""
+        index = bisect_left(self.departures, after)
+        return self.journeys[index:index + count]
+
+    def between(self, start: datetime, end: datetime) -> list[TimetableJourney]:
+        """Return the journeys leaving between two (naive, local) datetimes, both included."""
+        return self.journeys[bisect_left(self.departures, start):bisect_right(self.departures, end)]
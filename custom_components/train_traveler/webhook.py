@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+from functools import partial
+from http import HTTPStatus
+import logging
+
+from aiohttp import hdrs, web
+import voluptuous as vol
+
+from homeassistant.components import webhook
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_WEBHOOK_ID
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import config_validation as cv
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    DOMAIN,
+    CONF_CONNECTION,
+    CONF_DISRUPTION_WEBHOOK,
+    DATA_WEBHOOK,
+    PUSHED_DISRUPTION_DEFAULT_EFFECT
+)
+from .api import SncfApiClient
+from .disruptions import async_get_disruption_feed
+from .snapshot import PushedDisruption
+
+_LOGGER = logging.getLogger(__name__)
+
+PUSHED_DISRUPTIONS_SCHEMA = vol.Schema({
+    vol.Required("disruptions"): [vol.Schema({
+        vol.Required("id"): cv.string,
+        vol.Optional("trip"): cv.string,
+        vol.Optional("effect", default=PUSHED_DISRUPTION_DEFAULT_EFFECT): cv.string,
+        vol.Optional("message"): vol.Any(None, cv.string),
+        vol.Optional("delay"): vol.Any(None, vol.Coerce(float)),
+        vol.Optional("arrival_delay"): vol.Any(None, vol.Coerce(float)),
+        vol.Optional("cleared", default=False): cv.boolean
+    }, extra=vol.ALLOW_EXTRA)]
+}, extra=vol.ALLOW_EXTRA)
+
+
+def pushed_disruptions(payload: dict) -> list[PushedDisruption]:
+    """Read the disruptions of a payload validated with PUSHED_DISRUPTIONS_SCHEMA."""
+    received_at = dt_util.utcnow()
+    return [
+        PushedDisruption(
+            id=disruption["id"],
+            trip=disruption.get("trip"),
+            effect=disruption["effect"],
+            message=disruption.get("message"),
+            delay=disruption.get("delay"),
+            arrival_delay=disruption.get("arrival_delay"),
+            cleared=disruption["cleared"],
+            received_at=received_at
+        )
+        for disruption in payload["disruptions"]
+    ]
+
+
+async def async_handle_webhook(client: SncfApiClient, hass: HomeAssistant, webhook_id: str, request: web.Request) -> web.Response | None:
+    """Push the disruptions posted to the webhook of an entry to the routes of its API key."""
+    try:
+        payload = PUSHED_DISRUPTIONS_SCHEMA(await request.json())
+    except (ValueError, vol.Invalid) as err:
+        _LOGGER.warning("Invalid disruptions pushed to webhook %s: %s", webhook_id, err)
+        return web.Response(status=HTTPStatus.BAD_REQUEST, text=str(err))
+
+    disruptions = pushed_disruptions(payload)
+    _LOGGER.debug("%s disruptions pushed to webhook %s", len(disruptions), webhook_id)
+    async_get_disruption_feed(hass, client).async_push(disruptions)
+    return None
+
+
+@callback
+def async_update_webhook(hass: HomeAssistant, entry: ConfigEntry, entry_data: dict) -> None:
+    """Register the disruption webhook of an entry, or unregister it, as set in its options."""
+    webhook_id = entry.options.get(CONF_WEBHOOK_ID) if entry.options.get(CONF_DISRUPTION_WEBHOOK, False) else None
+    if entry_data.get(DATA_WEBHOOK) == webhook_id:
+        return
+
+    async_remove_webhook(hass, entry_data)
+    if webhook_id is not None:
+        _LOGGER.info("Disruptions of %s can be pushed to %s", entry.title, webhook.async_generate_path(webhook_id))
+        webhook.async_register(
+            hass,
+            DOMAIN,
+            f"{entry.title} disruptions",
+            webhook_id,
+            partial(async_handle_webhook, entry_data[CONF_CONNECTION]),
+            local_only=True,
+            allowed_methods=[hdrs.METH_POST]
+        )
+        entry_data[DATA_WEBHOOK] = webhook_id
+
+
+@callback
+def async_remove_webhook(hass: HomeAssistant, entry_data: dict) -> None:
+    if entry_data.get(DATA_WEBHOOK) is not None:
+        webhook.async_unregister(hass, entry_data.pop(DATA_WEBHOOK))